@@ -0,0 +1,410 @@
+""" Benchmarks of the evaluation core of the orbital Golomb problem and of the optimizers. """
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Directory containing the `modules` package (the notebooks run from there)
+CODE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules which are expensive to import and are not needed to evaluate the fitness
+HEAVY_MODULES = ("heyoka", "scipy", "matplotlib", "PIL", "SSIM_PIL", "numba")
+
+_IMPORT_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "time": elapsed,
+    "maxrss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "heavy": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+def import_time_benchmark(targets: dict = None, repeat: int = 5, verbose: bool = True) -> dict:
+    """
+    Measures in fresh interpreters the time and peak memory needed to import what a worker process needs.
+
+    Args:
+        targets (`dict[str, str]`, optional): name -> import statement to measure. Defaults to the evaluation core
+            alone against the evaluation core together with the plotting and integrator modules (the imports
+            `modules.golomb_problem` used to perform eagerly).
+        repeat (`int`, optional): number of fresh interpreters per target (the median time is reported).
+        verbose (`bool`, optional): print a summary table.
+
+    Returns:
+        `dict`: name -> {"time_s": median import time, "maxrss_mb": peak resident memory of the interpreter,
+                        "heavy_modules": heavy modules loaded by the import}.
+    """
+    if targets is None:
+        targets = {
+            "evaluation core": "import modules.golomb_problem",
+            "core + plots + integrator": "import modules.golomb_problem, modules.golomb_plots, modules.cr3bp_integrator",
+        }
+
+    results = dict()
+    for name, statement in targets.items():
+        runs = []
+        for _ in range(repeat):
+            out = subprocess.run(
+                [sys.executable, "-c", _IMPORT_PROBE.format(statement=statement, heavy=HEAVY_MODULES)],
+                cwd=CODE_DIR, capture_output=True, text=True, check=True,
+            )
+            runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        rss_unit = 1024 * 1024 if sys.platform == "darwin" else 1024
+        results[name] = {
+            "time_s": statistics.median(run["time"] for run in runs),
+            "maxrss_mb": max(run["maxrss"] for run in runs) / rss_unit,
+            "heavy_modules": runs[-1]["heavy"],
+        }
+
+    if verbose:
+        print(f"{'import':<30}{'time [s]':>10}{'max RSS [MB]':>14}  heavy modules")
+        for name, r in results.items():
+            print(f"{name:<30}{r['time_s']:>10.3f}{r['maxrss_mb']:>14.1f}  {', '.join(r['heavy_modules']) or '-'}")
+    return results
+
+def scaling_benchmark(
+    n_sats=(40, 100, 200, 500, 1000),
+    grid_sizes=(21, 101, 201, 401),
+    pop_size: int = 32,
+    repeat: int = 3,
+    seed: int = 0,
+    plot: bool = True,
+    plot_path: str = None,
+    verbose: bool = True,
+    **problem_kwargs,
+) -> list[dict]:
+    """
+    Measures the evaluation time and peak memory of `fitness_batch` against the number of satellites and the grid size
+    (see docs/Evaluation Complexity.md).
+
+    Args:
+        n_sats (`tuple[int]`, optional): numbers of satellites.
+        grid_sizes (`tuple[int]`, optional): grid sizes.
+        pop_size (`int`, optional): chromosomes evaluated per call.
+        repeat (`int`, optional): timed calls per configuration (the median is reported).
+        seed (`int`, optional): seed of the random chromosomes (see `orbital_golomb_array.sample_population`).
+        plot (`bool`, optional): plot time and memory against N, one line per grid size.
+        plot_path (`str`, optional): save the plot there instead of showing it.
+        verbose (`bool`, optional): print a summary table.
+        **problem_kwargs: other arguments of `init_problem` (orbit, n_meas, backend, compact, ...).
+
+    Returns:
+        `list[dict]`: one entry per configuration with n_sat, grid_size, "time_ms" per chromosome,
+                      "peak_mb" of the numpy allocations during a call and "in_grid" mean share of satellites in the grid.
+    """
+    import time
+    import tracemalloc
+    from modules.golomb_problem import init_problem
+
+    results = []
+    for grid_size in grid_sizes:
+        for n_sat in n_sats:
+            udp = init_problem(n_sat, grid_size, **problem_kwargs)
+            X = udp.sample_population(pop_size, seed)
+            # Warm-up (and compilation of the numba kernels)
+            udp.fitness_batch(X[:1])
+
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                udp.fitness_batch(X)
+                times.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            udp.fitness_batch(X)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            _, valid = udp.grid_positions(X)
+            results.append({
+                "n_sat": n_sat,
+                "grid_size": grid_size,
+                "time_ms": 1e3 * statistics.median(times) / pop_size,
+                "peak_mb": peak / 2**20,
+                "in_grid": float(valid.mean()),
+            })
+            if verbose:
+                r = results[-1]
+                print(f"N={n_sat:<6}grid={grid_size:<6}{r['time_ms']:>10.3f} ms/chromosome{r['peak_mb']:>10.1f} MB peak{100 * r['in_grid']:>8.1f}% in grid")
+
+    if plot:
+        from matplotlib import pyplot as plt
+
+        fig, ax = plt.subplots(1, 2, figsize=(12, 4))
+        for grid_size in grid_sizes:
+            rows = [r for r in results if r["grid_size"] == grid_size]
+            ax[0].loglog([r["n_sat"] for r in rows], [r["time_ms"] for r in rows], "o-", label=f"grid {grid_size}")
+            ax[1].loglog([r["n_sat"] for r in rows], [r["peak_mb"] for r in rows], "o-", label=f"grid {grid_size}")
+        ax[0].set_xlabel("satellites N")
+        ax[0].set_ylabel("time per chromosome [ms]")
+        ax[1].set_xlabel("satellites N")
+        ax[1].set_ylabel(f"peak memory per call of {pop_size} [MB]")
+        for a in ax:
+            a.grid(True, which="both", alpha=0.3)
+            a.legend()
+        fig.tight_layout()
+        if plot_path is None:
+            plt.show()
+        else:
+            fig.savefig(plot_path)
+            plt.close(fig)
+    return results
+
+def gwo_benchmark(
+    pack_sizes=(25, 100, 500, 1000, 5000),
+    dim: int = 240,
+    iterations: int = 5,
+    improved: bool = True,
+    target_function=None,
+    seed: int = 0,
+    verbose: bool = True,
+) -> list[dict]:
+    """
+    Measures the time per iteration and the peak memory of the grey wolf optimizers of modules/gwo.py against the
+    pack size: the functional implementation (`improved_grey_wolf_optimizer` / `grey_wolf_optimizer`) against
+    `GreyWolfEngine`, which preallocates its buffers.
+
+    Args:
+        pack_sizes (`tuple[int]`, optional): pack sizes.
+        dim (`int`, optional): dimension of the search space (6N, 240 for the medium and hard problems).
+        iterations (`int`, optional): iterations per run.
+        improved (`bool`, optional): iGWO (dimension learning) or plain GWO.
+        target_function (`callable`, optional): vectorized target. Defaults to the sum of the squares, so that the
+            overhead of the optimizer is measured rather than the fitness.
+        seed (`int`, optional): seed of the random numbers.
+        verbose (`bool`, optional): print a summary table.
+
+    Returns:
+        `list[dict]`: one entry per pack size and implementation with "time_ms" per iteration and "peak_mb" of the
+                      numpy allocations during the run.
+    """
+    import time
+    import tracemalloc
+    import numpy as np
+    from modules import gwo
+
+    def sum_of_squares(X):
+        return np.einsum("ij,ij->i", X, X)
+
+    sum_of_squares.vectorized = True
+    if target_function is None:
+        target_function = sum_of_squares
+    bounds = ([-1.0] * dim, [1.0] * dim)
+
+    def functional(pack_size):
+        np.random.seed(seed)
+        optimizer = gwo.improved_grey_wolf_optimizer if improved else gwo.grey_wolf_optimizer
+        optimizer(pack_size, *bounds, iterations, target_function, verbose=False)
+
+    def engine(pack_size):
+        gwo.GreyWolfEngine(pack_size, *bounds, iterations, target_function, improved=improved, seed=seed).run()
+
+    results = []
+    for pack_size in pack_sizes:
+        for name, run in (("functions", functional), ("engine", engine)):
+            tracemalloc.start()
+            start = time.perf_counter()
+            run(pack_size)
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results.append({
+                "pack_size": pack_size,
+                "implementation": name,
+                # Both implementations run iterations + 1 steps
+                "time_ms": 1e3 * elapsed / (iterations + 1),
+                "peak_mb": peak / 2**20,
+            })
+            if verbose:
+                r = results[-1]
+                print(f"pack={pack_size:<7}{name:<12}{r['time_ms']:>10.2f} ms/iteration{r['peak_mb']:>10.1f} MB peak")
+    return results
+
+def executor_benchmark(
+    n_sat: int = 40,
+    grid_size: int = 21,
+    pop_size: int = 200,
+    n_workers: int = None,
+    seed: int = 0,
+    verbose: bool = True,
+    **problem_kwargs,
+) -> dict:
+    """
+    Checks and times the evaluation of a population through a process pool (`gwo.evaluate` with an executor, as
+    used by the GWO functions) against the sequential loop, on the non-vectorized `udp.fitness` (which returns a list).
+    The target is pickled with every chunk of rows sent to the workers, so the process pool pays for the size of
+    the problem once per chunk.
+
+    Args:
+        n_sat (`int`, optional): number of satellites.
+        grid_size (`int`, optional): grid size.
+        pop_size (`int`, optional): chromosomes evaluated.
+        n_workers (`int`, optional): workers of the process pool. Defaults to the number of cores.
+        seed (`int`, optional): seed of the random chromosomes (see `orbital_golomb_array.sample_population`).
+        verbose (`bool`, optional): print a summary.
+        **problem_kwargs: other arguments of `init_problem`.
+
+    Returns:
+        `dict`: "sequential_s" and "executor_s" times of the evaluation and "pickled_kb", the size of the target.
+    """
+    import pickle
+    import time
+    from concurrent.futures import ProcessPoolExecutor
+    import numpy as np
+    from modules.golomb_problem import init_problem
+    from modules.gwo import evaluate
+
+    udp = init_problem(n_sat, grid_size, **problem_kwargs)
+    X = udp.sample_population(pop_size, seed)
+
+    start = time.perf_counter()
+    sequential = evaluate(udp.fitness, X)
+    sequential_s = time.perf_counter() - start
+
+    with ProcessPoolExecutor(n_workers) as executor:
+        # Start the workers before timing
+        list(executor.map(abs, range(n_workers or os.cpu_count() or 1)))
+        start = time.perf_counter()
+        parallel = evaluate(udp.fitness, X, executor)
+        executor_s = time.perf_counter() - start
+
+    if not np.array_equal(parallel, sequential):
+        raise AssertionError("The evaluation through the process pool differs from the sequential one")
+    results = {
+        "sequential_s": sequential_s,
+        "executor_s": executor_s,
+        "pickled_kb": len(pickle.dumps(udp.fitness)) / 2**10,
+    }
+    if verbose:
+        print(
+            f"{pop_size} chromosomes: sequential {sequential_s:.3f} s, process pool {executor_s:.3f} s "
+            f"(target of {results['pickled_kb']:.0f} kB)"
+        )
+    return results
+
+def lattice_benchmark(
+    problems=("medium", "hard"),
+    n_iter: int = 20000,
+    n_random: int = 1000,
+    seed: int = 0,
+    verbose: bool = True,
+) -> list[dict]:
+    """
+    Compares the lattice search (modules/lattice_search.py) with random feasible sampling on the preset problems:
+    the fitness of `n_random` chromosomes drawn by `feasibility.FeasibleSampler` against the one of `lattice_search`
+    started from random entries of its catalogue.
+
+    Args:
+        problems (`tuple[str]`, optional): preset problems, among "simple", "medium" and "hard".
+        n_iter (`int`, optional): moves of the lattice search.
+        n_random (`int`, optional): random feasible chromosomes.
+        seed (`int`, optional): seed of the catalogue, the search and the samples.
+        verbose (`bool`, optional): print a summary table.
+
+    Returns:
+        `list[dict]`: one entry per problem with the "random_mean" and "random_best" fitness of the samples, the
+                      "lattice" fitness of the search and the time "random_s", "catalogue_s" and "lattice_s" they took.
+    """
+    import time
+    from modules import golomb_problem
+    from modules.feasibility import FeasibleSampler
+    from modules.lattice_search import CellCatalogue, lattice_search
+
+    results = []
+    for name in problems:
+        udp = getattr(golomb_problem, f"init_{name}_problem")()
+
+        start = time.perf_counter()
+        fitness = udp.fitness_batch(FeasibleSampler(udp).sample(n_random, seed=seed))[:, 0]
+        random_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        catalogue = CellCatalogue(udp, seed=seed)
+        catalogue_s = time.perf_counter() - start
+        _, best_fit = lattice_search(udp, n_iter, catalogue=catalogue, seed=seed, verbose=False)
+
+        results.append({
+            "problem": name,
+            "random_mean": float(fitness.mean()),
+            "random_best": float(fitness.min()),
+            "lattice": best_fit[-1],
+            "random_s": random_s,
+            "catalogue_s": catalogue_s,
+            "lattice_s": time.perf_counter() - start - catalogue_s,
+        })
+        if verbose:
+            r = results[-1]
+            print(
+                f"{name:<8}random feasible mean {r['random_mean']:.3f} best {r['random_best']:.3f} ({r['random_s']:.1f} s)"
+                f"   lattice search {r['lattice']:.3f} ({r['catalogue_s']:.1f} s catalogue + {r['lattice_s']:.1f} s search)"
+            )
+    return results
+
+def cell_encoding_benchmark(
+    problems=("medium", "hard"),
+    n_samples: int = 200,
+    seed: int = 0,
+    verbose: bool = True,
+) -> list[dict]:
+    """
+    Compares the search space of the integer encoding (modules/cell_problem.py) with the continuous one on the preset
+    problems: the fitness of uniform random integer decision vectors against the one of random feasible chromosomes
+    (`feasibility.FeasibleSampler`), the starting points of the optimizers in either space.
+
+    Args:
+        problems (`tuple[str]`, optional): preset problems, among "simple", "medium" and "hard".
+        n_samples (`int`, optional): random points of each space.
+        seed (`int`, optional): seed of the samples.
+        verbose (`bool`, optional): print a summary table.
+
+    Returns:
+        `list[dict]`: one entry per problem with the "integer_mean", "integer_best", "continuous_mean" and
+                      "continuous_best" fitness of the samples and the decoding time "decode_ms" per decision vector.
+    """
+    import time
+    import numpy as np
+    from modules import golomb_problem
+    from modules.cell_problem import orbital_golomb_cells
+    from modules.feasibility import FeasibleSampler
+
+    results = []
+    for name in problems:
+        udp = getattr(golomb_problem, f"init_{name}_problem")()
+        cells = orbital_golomb_cells(udp)
+        lower, upper = (np.array(bound) for bound in cells.get_bounds())
+        dvs = np.random.default_rng(seed).integers(lower, upper + 1, size=(n_samples, len(lower)))
+
+        start = time.perf_counter()
+        X = cells.to_chromosome(dvs)
+        decode_s = time.perf_counter() - start
+        integer = udp.fitness_batch(X)[:, 0]
+        continuous = udp.fitness_batch(FeasibleSampler(udp).sample(n_samples, seed=seed))[:, 0]
+
+        results.append({
+            "problem": name,
+            "integer_mean": float(integer.mean()),
+            "integer_best": float(integer.min()),
+            "continuous_mean": float(continuous.mean()),
+            "continuous_best": float(continuous.min()),
+            "decode_ms": 1e3 * decode_s / n_samples,
+        })
+        if verbose:
+            r = results[-1]
+            print(
+                f"{name:<8}integer mean {r['integer_mean']:.3f} best {r['integer_best']:.3f} ({r['decode_ms']:.2f} ms/decoding)"
+                f"   feasible continuous mean {r['continuous_mean']:.3f} best {r['continuous_best']:.3f}"
+            )
+    return results
+
+if __name__ == "__main__":
+    import_time_benchmark()
+    scaling_benchmark()
+    gwo_benchmark()
+    executor_benchmark()
+    lattice_benchmark()
+    cell_encoding_benchmark()
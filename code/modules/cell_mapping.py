@@ -0,0 +1,89 @@
+""" Inverse of the cell assignment: initial relative states of the satellites landing in given cells at every observation.
+The position of a satellite at observation k is projection[k] @ x_s (see modules/formation.py), so its M cells
+constrain its 6 initial components with 3M two-sided linear inequalities: the interiors of the cells. """
+import numpy as np
+
+def cell_intervals(cells, grid_size: int):
+    """
+    Interiors of the cells in grid units, the inverse of the quantization of `Formation.grid_positions`.
+
+    A coordinate p falls in cell c = trunc(p * grid_size / 2 + grid_size // 2) of the grid when -1 < p < 1.
+    Cell 0 also collects the slightly negative values truncated to zero when grid_size is odd.
+
+    Args:
+        cells (`np.ndarray` (..., 3)): integer cell coordinates.
+        grid_size (`int`): size of the Golomb grid.
+
+    Returns:
+        (lower, upper) `np.ndarray` (..., 3): open intervals of the positions, in the units of the scaled cells q = p * grid_size / 2 + grid_size // 2.
+    """
+    cells = np.asarray(cells)
+    half = grid_size // 2
+    # Edges of the grid (p = -1 and p = 1) in the units of the cells
+    q_min, q_max = -grid_size / 2 + half, grid_size / 2 + half
+    lower = np.where(cells == 0, np.maximum(-1.0, q_min), cells).astype(float)
+    upper = np.minimum(cells + 1.0, q_max)
+    return lower, upper
+
+def solve_cells(projection, cells, grid_size: int, state_bounds=(-1.0, 1.0), tol: float = 1e-9, lp: bool = True):
+    """
+    Initial states landing in the target cells, for many satellites at once.
+
+    The least-squares solution towards the centres of the cells (one pseudo-inverse of the 3M x 6 system for all the
+    satellites) is kept when it lies inside every cell and within the bounds of the chromosome. The other satellites
+    solve a small LP (scipy, imported on first use) maximizing the distance from the edges of the cells: when that
+    distance is not positive, no initial state reaches the targets.
+
+    Args:
+        projection (`np.ndarray` (M, 3, 6)): projection tensor of the problem.
+        cells (`np.ndarray` (n, M, 3)): target cell of each satellite at each observation.
+        grid_size (`int`): size of the Golomb grid.
+        state_bounds (`tuple`, optional): (lower, upper) bounds of the 6 components, scalars or arrays (6,).
+        tol (`float`, optional): minimum distance from the edges of the cells, in cells.
+        lp (boolean, optional): solve the LP for the satellites missed by the least squares. Without it, a satellite
+                                is only found feasible when its least-squares state lands in its cells.
+
+    Returns:
+        (states (n, 6), feasible (n,), method (n,)): initial states, whether they reach the targets and how they
+        were found ("lstsq", "lp", or "" for the infeasible ones, whose state is the least-squares one).
+    """
+    cells = np.asarray(cells, dtype=int)
+    n, M = cells.shape[:2]
+    lower, upper = cell_intervals(cells, grid_size)
+    lower, upper = lower.reshape(n, 3 * M), upper.reshape(n, 3 * M)
+    state_lower = np.broadcast_to(np.asarray(state_bounds[0], dtype=float), (6,))
+    state_upper = np.broadcast_to(np.asarray(state_bounds[1], dtype=float), (6,))
+
+    # Scaled cells q = A x + half at all the observations
+    half = grid_size // 2
+    A = projection.reshape(3 * M, 6) * grid_size / 2
+
+    def slack(states):
+        q = states @ A.T + half
+        return np.minimum(np.min(q - lower, axis=1), np.min(upper - q, axis=1))
+
+    def in_bounds(states):
+        return np.all((states >= state_lower) & (states <= state_upper), axis=1)
+
+    # 1) Least squares towards the centres of the cells
+    states = ((lower + upper) / 2 - half) @ np.linalg.pinv(A).T
+    feasible = (slack(states) > tol) & in_bounds(states)
+    method = np.where(feasible, "lstsq", "")
+
+    # 2) Largest margin inside the cells: maximize t s.t. lower + t <= A x + half <= upper - t, state_lower <= x <= state_upper
+    rows = np.flatnonzero(~feasible & np.all((cells >= 0) & (cells < grid_size), axis=(1, 2)))
+    if lp and len(rows):
+        from scipy.optimize import linprog
+
+        A_ub = np.block([[-A, np.ones((3 * M, 1))], [A, np.ones((3 * M, 1))]])
+        cost = np.zeros(7)
+        cost[-1] = -1.0
+        bounds = list(zip(state_lower, state_upper)) + [(None, 1.0)]
+        for s in rows:
+            b_ub = np.concatenate((half - lower[s], upper[s] - half))
+            result = linprog(cost, A_ub=A_ub, b_ub=b_ub, bounds=bounds, method="highs")
+            if result.status == 0 and -result.fun > tol:
+                states[s] = result.x[:6]
+                feasible[s] = True
+                method[s] = "lp"
+    return states, feasible, method
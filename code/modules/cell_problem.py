@@ -0,0 +1,152 @@
+""" Integer encoding of the orbital Golomb problem for the mixed-integer algorithms of pygmo (gaco, ihs, sga...).
+The fitness only depends on the cells occupied by the satellites, so the decision vector holds the target cells of
+every satellite at every observation, and the chromosome is built through the inverse of the linear propagation
+(see `cell_mapping.solve_cells`), which fits the 6 initial components to the targets of all the observations at once:
+- the cells at the first observation (t = 0, where the STM is the identity) are absolute,
+- along the coordinates where the velocities within their bounds cannot sweep the whole grid, the cells at the other
+  observations are encoded as offsets from the ones the satellite would reach with zero initial velocity, within
+  that reach: most absolute cells would be out of reach.
+Most random targets cannot all be reached by a single initial state: the satellites which miss some of their cells
+keep their least-squares state, projected onto their feasible polytope (see `feasibility.FeasibilityRepair`), so that
+every satellite stays in the grid at every observation, in the reachable cells nearest to its targets. """
+import numpy as np
+
+from modules.cell_mapping import cell_intervals, solve_cells
+from modules.feasibility import FeasibilityRepair
+
+class orbital_golomb_cells:
+    def __init__(self, udp, lp: bool = False):
+        """Constructs a UDP with integer cell targets sharing the dynamics and the fitness of an `orbital_golomb_array`.
+
+        Decision vector: the cells or offsets of every observation (3 * n_meas * N integers), laid out by observation,
+        then coordinate, then satellite: the target of satellite s at observation k along coordinate c is
+        dv[(3 * k + c) * N + s] (the cells at t = 0 are laid out as the positions in the chromosome).
+        The fitness is always the one of the chromosome returned by `to_chromosome`.
+
+        Args:
+            udp (`orbital_golomb_array`): The orbital Golomb problem.
+            lp (boolean, optional): Look for an exact solution (scipy LP, see `cell_mapping.solve_cells`) when the
+                                    least-squares state misses some targets. About 1 ms per satellite, and few random
+                                    targets are reachable: off by default.
+        """
+        self.udp = udp
+        self.n_sat = udp.n_sat
+        self.n_meas = udp.n_meas
+        self.lp = lp
+        g = udp.grid_size
+        lower, upper = (np.reshape(bound, (6, self.n_sat))[:, 0] for bound in udp.get_bounds())
+        self._state_bounds = (lower, upper)
+        self.repair = FeasibilityRepair(udp)
+
+        # Reach of the initial velocities at every observation, in cells: (n_meas, 3)
+        velocity = udp.projection[:, :, 3:] * g / 2
+        reach = np.abs(velocity) @ np.maximum(np.abs(lower[3:]), np.abs(upper[3:]))
+        # Coordinates encoded by absolute cells (always at t = 0), the others by offsets within the reach
+        self.absolute = reach >= g - 1
+        self.absolute[0] = True
+        self.offset_bound = np.ceil(reach).astype(int)
+        integer_lower = np.where(self.absolute, 0, -self.offset_bound)
+        integer_upper = np.where(self.absolute, g - 1, self.offset_bound)
+        self._integer_bounds = (
+            np.repeat(integer_lower.ravel(), self.n_sat).tolist(),
+            np.repeat(integer_upper.ravel(), self.n_sat).tolist(),
+        )
+
+        # Initial positions from the positions at t = 0, positions at every observation from the initial positions
+        self._position_inverse = np.linalg.inv(udp.projection[0, :, :3])
+        self._positions_map = udp.projection[:, :, :3]
+
+    # Mandatory method in the UDP pygmo interface
+    def get_bounds(self):
+        return (list(self._integer_bounds[0]), list(self._integer_bounds[1]))
+
+    def get_nix(self):
+        """
+        Get number of integer variables in the chromosome/decision vector.
+
+        Returns:
+            int: number of integer variables (the whole decision vector).
+        """
+        return 3 * self.n_meas * self.n_sat
+
+    def get_name(self):
+        return "Orbital Golomb array, integer cells at every observation"
+
+    def _scaled_cells(self, positions):
+        """Positions (grid units) in the units of the cells q = p * grid_size / 2 + grid_size // 2."""
+        return positions * self.udp.grid_size / 2 + self.udp.grid_size // 2
+
+    def _positions(self, q):
+        """Inverse of `_scaled_cells`."""
+        return (q - self.udp.grid_size // 2) * 2 / self.udp.grid_size
+
+    def _predicted_cells(self, cells):
+        """Cells at every observation with zero initial velocity, from the centres of the cells at t = 0 (P, 3, N): (P, n_meas, 3, N)."""
+        lower, upper = cell_intervals(cells, self.udp.grid_size)
+        dx = self._position_inverse @ self._positions((lower + upper) / 2)
+        return np.floor(self._scaled_cells(np.einsum("kij,pjn->pkin", self._positions_map, dx))).astype(int)
+
+    def target_cells(self, dvs) -> np.ndarray:
+        """
+        Cells encoded by decision vectors, clipped to the grid.
+
+        Args:
+            dvs (`np.ndarray` (P, len(dv)) or (len(dv),)): decision vectors, one per row.
+
+        Returns:
+            `np.ndarray` (P, n_meas, 3, N): target cell of every satellite at every observation.
+        """
+        integers = np.rint(np.asarray(dvs, dtype=float)).astype(int).reshape(-1, self.n_meas, 3, self.n_sat)
+        absolute = self.absolute[np.newaxis, :, :, np.newaxis]
+        cells = np.where(absolute, integers, self._predicted_cells(integers[:, 0]) + integers)
+        return np.clip(cells, 0, self.udp.grid_size - 1)
+
+    def to_chromosome(self, dvs) -> np.ndarray:
+        """
+        Chromosomes of `orbital_golomb_array` encoded by decision vectors of this problem.
+
+        Args:
+            dvs (`np.ndarray` (P, len(dv)) or (len(dv),)): decision vectors, one per row.
+
+        Returns:
+            `np.ndarray` (P, 6N) or (6N,): initial states, every satellite in the grid at every observation.
+        """
+        dvs = np.asarray(dvs, dtype=float)
+        cells = self.target_cells(dvs)
+        P, n = len(cells), self.n_sat
+        targets = cells.transpose(0, 3, 1, 2).reshape(P * n, self.n_meas, 3)
+        states, _, _ = solve_cells(self.udp.projection, targets, self.udp.grid_size, self._state_bounds, lp=self.lp)
+        X = self.repair(states.reshape(P, n, 6).transpose(0, 2, 1).reshape(P, 6 * n))
+        return X[0] if dvs.ndim == 1 else X
+
+    def from_chromosome(self, x) -> np.ndarray:
+        """
+        Decision vectors encoding the cells of chromosomes of `orbital_golomb_array`, e.g. to seed a population from
+        continuous solutions. The satellites outside the grid are moved to its nearest cells.
+
+        Args:
+            x (`np.ndarray` (P, 6N) or (6N,)): chromosomes, one per row.
+
+        Returns:
+            `np.ndarray` (P, len(dv)) or (len(dv),): decision vectors.
+        """
+        x = np.asarray(x, dtype=float)
+        positions = self.udp.formation(x).positions()
+        q = self._scaled_cells(positions)
+        # Cells inside the grid are truncated towards the centre, as by the quantization of the fitness
+        cells = np.where(np.abs(positions) < 1, np.trunc(q), np.floor(q))
+        cells = np.clip(cells, 0, self.udp.grid_size - 1).astype(int)
+        absolute = self.absolute[np.newaxis, :, :, np.newaxis]
+        integers = np.where(absolute, cells, cells - self._predicted_cells(cells[:, 0]))
+        lower, upper = (np.reshape(bound, (self.n_meas, 3, self.n_sat)) for bound in self._integer_bounds)
+        dvs = np.clip(integers, lower, upper).reshape(len(positions), -1).astype(float)
+        return dvs[0] if x.ndim == 1 else dvs
+
+    # Mandatory method in the UDP pygmo interface
+    def fitness(self, dv):
+        return self.udp.fitness_batch(self.to_chromosome(dv))[0].tolist()
+
+    def batch_fitness(self, dvs):
+        """Fitness of a flattened population of decision vectors (pygmo batch evaluation interface)."""
+        dvs = np.reshape(dvs, (-1, 3 * self.n_meas * self.n_sat))
+        return self.udp.fitness_batch(self.to_chromosome(dvs)).ravel()
@@ -0,0 +1,155 @@
+""" Compiled Taylor integrator of the CR3BP variational equations, built once per process and reused. """
+import threading
+import time
+
+import heyoka as hy
+import numpy as np
+
+# These are the initial conditions on the variational equations (the identity matrix)
+IC_VAR = np.eye(6).reshape((36,)).tolist()
+
+def build_variational_integrator(tol=1e-16):
+    """Builds (symbolic dynamics + LLVM compilation) the Taylor integrator of the CR3BP and its variational equations
+    Args:
+        tol (`float`): tolerance of the Taylor integrator
+    Returns:
+        hy.taylor_adaptive: integrator of the 6 states + 36 variations, with the gravity parameter as hy.par[0]
+    """
+    # ----- We assemble the CR3BP equation of motion --------
+    # The state
+    x, y, z, vx, vy, vz = hy.make_vars("x", "y", "z", "vx", "vy", "vz")
+    xarr = np.array([x, y, z, vx, vy, vz])
+    # The dynamics
+    r_1 = hy.sqrt((x + hy.par[0]) ** 2 + y**2 + z**2)
+    r_2 = hy.sqrt((x - (1 - hy.par[0])) ** 2 + y**2 + z**2)
+    dxdt = vx
+    dydt = vy
+    dzdt = vz
+    dvxdt = (
+        2 * vy
+        + x
+        - (1 - hy.par[0]) * (x + hy.par[0]) / (r_1**3)
+        - hy.par[0] * (x + hy.par[0] - 1) / (r_2**3)
+    )
+    dvydt = -2 * vx + y - (1 - hy.par[0]) * y / (r_1**3) - hy.par[0] * y / (r_2**3)
+    dvzdt = -(1 - hy.par[0]) / (r_1**3) * z - hy.par[0] / (r_2**3) * z
+    # This array contains the expressions (r.h.s.) of our dynamics
+    farr = np.array([dxdt, dydt, dzdt, dvxdt, dvydt, dvzdt])
+
+    # We now compute the variational equations
+    # 1 - Define the symbols
+    symbols_phi = []
+    for i in range(6):
+        for j in range(6):
+            # Here we define the symbol for the variations
+            symbols_phi.append("phi_" + str(i) + str(j))
+    phi = np.array(hy.make_vars(*symbols_phi)).reshape((6, 6))
+
+    # 2 - Compute the gradient
+    dfdx = []
+    for i in range(6):
+        for j in range(6):
+            dfdx.append(hy.diff(farr[i], xarr[j]))
+    dfdx = np.array(dfdx).reshape((6, 6))
+
+    # 3 - Assemble the expressions for the r.h.s. of the variational equations
+    dphidt = dfdx @ phi
+
+    dyn = []
+    for state, rhs in zip(xarr, farr):
+        dyn.append((state, rhs))
+    for state, rhs in zip(phi.reshape((36,)), dphidt.reshape((36,))):
+        dyn.append((state, rhs))
+
+    return hy.taylor_adaptive(
+        # The ODEs.
+        dyn,
+        # The initial conditions (do not matter, they will change)
+        [0.1] * 6 + IC_VAR,
+        # Operate below machine precision
+        # and in high-accuracy mode.
+        tol=tol,
+    )
+
+class IntegratorRegistry:
+    """
+    Registry of the compiled integrators, one per tolerance.
+
+    It can be pickled together with the compiled integrators and installed in a worker process
+    (see `install_integrators`), so that workers do not compile the dynamics again.
+    """
+
+    def __init__(self):
+        self.integrators = dict()
+        self._lock = threading.RLock()
+
+    def get(self, tol=1e-16, verbose=False):
+        """
+        Returns the integrator for a tolerance, building it only the first time.
+
+        Args:
+            tol (`float`): tolerance of the Taylor integrator.
+            verbose (`bool`): print time it took to build the Taylor integrator.
+        """
+        with self._lock:
+            if tol not in self.integrators:
+                start_time = time.time()
+                self.integrators[tol] = build_variational_integrator(tol)
+                if verbose:
+                    print(
+                        "--- %s seconds --- to build the Taylor integrator -- (do this only once)"
+                        % (time.time() - start_time)
+                    )
+            return self.integrators[tol]
+
+    def propagate_grid(self, ic, t_grid, mu, tol=1e-16, verbose=False):
+        """
+        Propagates the reference trajectory and its STMs on a time grid with the shared integrator.
+        Only the state, time and parameters of the integrator are reset between calls.
+
+        Args:
+            ic (`np.array` (6,)): initial conditions (absolute).
+            t_grid (`np.array` (M,)): time grid, starting from 0.
+            mu (`float`): gravity parameter.
+            tol (`float`): tolerance of the Taylor integrator.
+            verbose (`bool`): print time it took to build the Taylor integrator.
+        Returns:
+            np.array (M, 42): the propagated state and (flattened) stms at each point of the grid
+        """
+        with self._lock:
+            ta = self.get(tol, verbose)
+            # We set the Taylor integration param
+            ta.pars[:] = [mu]
+            # We set the ic
+            ta.state[:6] = ic
+            ta.state[6:] = IC_VAR
+            ta.time = 0.0
+            # We integrate
+            return np.array(ta.propagate_grid(t_grid)[4])
+
+    def __getstate__(self):
+        return {"integrators": dict(self.integrators)}
+
+    def __setstate__(self, state):
+        self.integrators = state["integrators"]
+        self._lock = threading.RLock()
+
+# Integrators of this process
+INTEGRATORS = IntegratorRegistry()
+
+def get_integrator(tol=1e-16, verbose=False):
+    """Returns the compiled integrator of this process for a tolerance (see `IntegratorRegistry.get`)."""
+    return INTEGRATORS.get(tol, verbose)
+
+def export_integrators() -> IntegratorRegistry:
+    """Returns the registry of this process, to be pickled and sent to worker processes."""
+    return INTEGRATORS
+
+def install_integrators(registry: IntegratorRegistry) -> None:
+    """
+    Installs the integrators compiled by another process, e.g. as a process pool initializer:
+    `ProcessPoolExecutor(initializer=install_integrators, initargs=(export_integrators(),))`
+    """
+    with INTEGRATORS._lock:
+        for tol, ta in registry.integrators.items():
+            INTEGRATORS.integrators.setdefault(tol, ta)
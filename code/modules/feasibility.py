@@ -0,0 +1,256 @@
+""" Feasibility of the satellites of the orbital Golomb problem: a satellite counts in the fitness only if it stays in
+the grid (-1 < p < 1 after the inflation rescaling) at every observation. The positions are linear in the initial
+state, p_k = projection[k] @ x_s, so the feasible states of each satellite form a polytope of R^6 (symmetric around
+the origin, intersected with the bounds of the chromosome) and the satellites are independent from each other. """
+import numpy as np
+
+def satellite_polytope(udp, margin: float = 1e-6):
+    """
+    Feasible initial states of a single satellite: |A x| <= 1 - margin and lower <= x <= upper.
+
+    Args:
+        udp (`orbital_golomb_array`): The orbital Golomb problem.
+        margin (`float`, optional): distance kept from the edges of the grid, in grid units.
+
+    Returns:
+        (A (3M, 6), limit, lower (6,), upper (6,)): rows of the positions at every observation, their limit and the bounds.
+    """
+    lower, upper = (np.reshape(bound, (6, udp.n_sat))[:, 0] for bound in udp.get_bounds())
+    return udp.projection.reshape(-1, 6), 1.0 - margin, lower, upper
+
+def feasible_satellites(udp, X, margin: float = 0.0) -> np.ndarray:
+    """Whether every satellite of every chromosome (P, 6N) stays in the grid at every observation: (P, N)."""
+    A, limit, _, _ = satellite_polytope(udp, margin)
+    states = np.reshape(X, (-1, 6, udp.n_sat))
+    return np.all(np.abs(np.einsum("rj,pjn->prn", A, states)) < limit, axis=1)
+
+class FeasibilityRepair:
+    """
+    Repair operator projecting the satellites of a chromosome or of a population onto their feasible polytope.
+
+    The satellites already in the grid at every observation are left untouched. The others are projected with
+    Dykstra's alternating projections onto the half-spaces of the polytope and the box of the bounds, vectorized
+    over all the satellites to repair; the few still outside after n_iter sweeps are shrunk towards the origin
+    (always feasible) until they are inside. The sweeps converge to the Euclidean projection but slowly, the
+    polytopes being elongated: 30 sweeps move the satellites about 20% further than needed, 300 sweeps less than 1%.
+
+    Example:
+        repair = FeasibilityRepair(udp)
+        X = repair(X)
+        repair.stats()  # satellites checked, outside the grid and rescued
+    """
+
+    def __init__(self, udp, margin: float = 1e-6, n_iter: int = 30):
+        """
+        Args:
+            udp (`orbital_golomb_array`): The orbital Golomb problem.
+            margin (`float`, optional): distance kept from the edges of the grid by the repaired satellites, in grid units.
+            n_iter (`int`, optional): number of sweeps of the alternating projections.
+        """
+        self.udp = udp
+        self.n_sat = udp.n_sat
+        self.n_iter = n_iter
+        A, self.limit, self.lower, self.upper = satellite_polytope(udp, margin)
+        # Half-spaces a.x <= limit of both signs
+        self._rows = np.concatenate((A, -A))
+        self._rows_norm2 = np.sum(self._rows**2, axis=1)
+        self.reset()
+
+    def reset(self) -> None:
+        """Resets the counters."""
+        self.counts = {"chromosomes": 0, "satellites": 0, "outside": 0, "rescued": 0}
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            `dict`: chromosomes and satellites repaired so far, how many satellites were outside the grid at some
+                    observation and how many of them were moved back into the grid, with the corresponding rates.
+        """
+        stats = dict(self.counts)
+        stats["outside_rate"] = stats["outside"] / stats["satellites"] if stats["satellites"] else 0.0
+        stats["rescued_rate"] = stats["rescued"] / stats["outside"] if stats["outside"] else 0.0
+        return stats
+
+    def project(self, states) -> np.ndarray:
+        """
+        Projection of initial states of single satellites onto the feasible polytope.
+
+        Args:
+            states (`np.ndarray` (S, 6)): initial states.
+
+        Returns:
+            `np.ndarray` (S, 6): feasible states.
+        """
+        y = np.array(states, dtype=float)
+        # Dykstra's corrections of every set (the half-spaces, then the box)
+        corrections = np.zeros((len(self._rows) + 1,) + y.shape)
+        for _ in range(self.n_iter):
+            for r, (row, norm2) in enumerate(zip(self._rows, self._rows_norm2)):
+                z = y + corrections[r]
+                excess = np.maximum(z @ row - self.limit, 0.0)
+                y = z - (excess / norm2)[:, np.newaxis] * row
+                corrections[r] = z - y
+            z = y + corrections[-1]
+            y = np.clip(z, self.lower, self.upper)
+            corrections[-1] = z - y
+
+        # Safeguard: the polytope contains the origin, shrink what is still outside until it is inside
+        y = np.clip(y, self.lower, self.upper)
+        extent = np.max(np.abs(y @ self._rows.T), axis=1)
+        return y * np.minimum(1.0, self.limit / np.maximum(extent, 1e-300))[:, np.newaxis]
+
+    def __call__(self, X) -> np.ndarray:
+        """
+        Repairs a chromosome (6N,) or a population (P, 6N): returns a copy whose satellites all stay in the grid.
+        """
+        X = np.array(X, dtype=float)
+        states = X.reshape(-1, 6, self.n_sat)
+        outside = ~self._inside(states)
+        p, n = np.nonzero(outside)
+        if len(p):
+            states[p, :, n] = self.project(states[p, :, n])
+
+        self.counts["chromosomes"] += len(states)
+        self.counts["satellites"] += outside.size
+        self.counts["outside"] += len(p)
+        self.counts["rescued"] += int(np.count_nonzero(self._inside(states)[p, n]))
+        return X
+
+    def _inside(self, states) -> np.ndarray:
+        """Whether the satellites (P, 6, N) are within the bounds and in the grid at every observation: (P, N)."""
+        in_grid = feasible_satellites(self.udp, states)
+        in_bounds = np.all((states >= self.lower[:, np.newaxis]) & (states <= self.upper[:, np.newaxis]), axis=1)
+        return in_grid & in_bounds
+
+class FeasibleSampler:
+    """
+    Uniform sampler of the feasible initial states of the satellites (see `satellite_polytope`), through independent
+    hit-and-run chains started from the origin and vectorized over the samples.
+
+    The polytopes are elongated (the projection is ill-conditioned), so the directions of the chords are drawn in
+    rounded coordinates: Gaussian with covariance (A^T A)^-1, which makes the ellipsoid {x: |A x|_2 <= 1} a sphere.
+    The chromosomes are products of independent satellites, so they are uniform on the feasible region of R^6N.
+
+    Example:
+        sampler = FeasibleSampler(udp)
+        X = sampler.sample(100, stratified=True, seed=0)  # start_init of the GWO functions, init of scipy's DE
+    """
+
+    def __init__(self, udp, margin: float = 1e-6, burn_in: int = 100):
+        """
+        Args:
+            udp (`orbital_golomb_array`): The orbital Golomb problem.
+            margin (`float`, optional): distance kept from the edges of the grid, in grid units.
+            burn_in (`int`, optional): number of hit-and-run steps of every chain before its sample.
+        """
+        self.udp = udp
+        self.n_sat = udp.n_sat
+        self.burn_in = burn_in
+        A, self.limit, self.lower, self.upper = satellite_polytope(udp, margin)
+        self._rows = np.concatenate((A, -A))
+        self._rounding = np.linalg.cholesky(np.linalg.inv(A.T @ A))
+
+    def sample_states(self, n: int, rng=None) -> np.ndarray:
+        """
+        Args:
+            n (`int`): number of samples.
+            rng (`np.random.Generator` or `int`, optional): random generator or seed.
+
+        Returns:
+            `np.ndarray` (n, 6): independent uniform samples of the feasible initial states of a single satellite.
+        """
+        rng = np.random.default_rng(rng)
+        x = np.zeros((n, 6))
+        for _ in range(self.burn_in):
+            d = rng.standard_normal((n, 6)) @ self._rounding.T
+            # Chord through x along d: rows . (x + t d) <= limit and lower <= x + t d <= upper
+            slope = d @ self._rows.T
+            room = self.limit - x @ self._rows.T
+            with np.errstate(divide="ignore", invalid="ignore"):
+                t_rows = room / slope
+                t_low, t_high = (self.lower - x) / d, (self.upper - x) / d
+            t_max = np.minimum(
+                np.min(np.where(slope > 0, t_rows, np.inf), axis=1), np.min(np.where(d > 0, t_high, np.where(d < 0, t_low, np.inf)), axis=1)
+            )
+            t_min = np.maximum(
+                np.max(np.where(slope < 0, t_rows, -np.inf), axis=1), np.max(np.where(d > 0, t_low, np.where(d < 0, t_high, -np.inf)), axis=1)
+            )
+            x += rng.uniform(t_min, t_max)[:, np.newaxis] * d
+        return x
+
+    def sample(self, n_chromosomes: int, stratified: bool = False, seed=None) -> np.ndarray:
+        """
+        Feasible chromosomes: every satellite stays in the grid at every observation.
+
+        Args:
+            n_chromosomes (`int`): number of chromosomes.
+            stratified (boolean, optional): draw the satellites of each chromosome in distinct cells at every
+                                            observation (from 4N candidates, as long as enough of them are distinct).
+            seed (`int`, optional): seed of the random generator.
+
+        Returns:
+            `np.ndarray` (n_chromosomes, 6N): population of chromosomes, one per row.
+        """
+        rng = np.random.default_rng(seed)
+        N = self.n_sat
+        if not stratified:
+            states = self.sample_states(n_chromosomes * N, rng).reshape(n_chromosomes, N, 6)
+            return states.transpose(0, 2, 1).reshape(n_chromosomes, 6 * N)
+
+        candidates = self.sample_states(n_chromosomes * 4 * N, rng).reshape(n_chromosomes, 4 * N, 6)
+        pos3D, _ = self.udp.grid_positions(candidates.transpose(0, 2, 1).reshape(n_chromosomes, -1), n_sat=4 * N)
+        g = self.udp.grid_size
+        cells = (pos3D[:, :, 0].astype(np.int64) * g + pos3D[:, :, 1]) * g + pos3D[:, :, 2]
+        X = np.empty((n_chromosomes, 6 * N))
+        for p in range(n_chromosomes):
+            # Greedy: keep the candidates whose cells are all new, then fill up with the others
+            taken = [set() for _ in range(cells.shape[1])]
+            chosen = []
+            for c in range(4 * N):
+                if all(cells[p, k, c] not in taken[k] for k in range(len(taken))):
+                    chosen.append(c)
+                    for k in range(len(taken)):
+                        taken[k].add(cells[p, k, c])
+                    if len(chosen) == N:
+                        break
+            chosen += [c for c in range(4 * N) if c not in chosen][: N - len(chosen)]
+            X[p] = candidates[p, chosen].T.reshape(-1)
+        return X
+
+def feasible_population(udp, size: int, stratified: bool = False, seed=None, **kwargs) -> np.ndarray:
+    """Shortcut of `FeasibleSampler(udp, **kwargs).sample(size, stratified, seed)`."""
+    return FeasibleSampler(udp, **kwargs).sample(size, stratified, seed)
+
+def differential_evolution(udp, repair: FeasibilityRepair = None, **kwargs):
+    """
+    scipy's differential evolution on the vectorized fitness of an `orbital_golomb_array`, the population being
+    repaired before every evaluation when a repair operator is given.
+
+    scipy keeps the unrepaired vectors in its population, so the returned `x` is replaced by its repaired version
+    (the one actually evaluated).
+
+    Args:
+        udp (`orbital_golomb_array`): The orbital Golomb problem.
+        repair (`FeasibilityRepair`, optional): repair operator applied before the evaluations.
+        **kwargs: arguments of `scipy.optimize.differential_evolution`.
+
+    Returns:
+        `scipy.optimize.OptimizeResult`: result of the optimization.
+    """
+    from scipy.optimize import differential_evolution as scipy_differential_evolution
+
+    def objective(x):
+        # scipy passes the population transposed, (D, S)
+        X = x.T if repair is None else repair(x.T)
+        return udp.fitness_batch(X)[:, 0]
+
+    kwargs.setdefault("updating", "deferred")
+    # The fitness is piecewise constant: a gradient-based polishing of the result cannot improve it
+    kwargs.setdefault("polish", False)
+    lower, upper = udp.get_bounds()
+    result = scipy_differential_evolution(
+        objective, list(zip(lower, upper)), vectorized=True, **kwargs
+    )
+    if repair is not None:
+        result.x = repair(result.x)
+    return result
@@ -0,0 +1,243 @@
+import numpy as np
+
+# Coordinates projected on each observation plane: XY, XZ and YZ
+PLANES = ((0, 1), (0, 2), (1, 2))
+
+# Memory budget of the temporaries of the batched counting (the sets of satellites are processed in chunks)
+CHUNK_BYTES = 1 << 26
+
+def _row_chunks(n_rows: int, bytes_per_row: int, chunk_bytes: int) -> list[slice]:
+    """Slices of consecutive rows whose temporaries fit in chunk_bytes (at least one row each)."""
+    step = max(1, chunk_bytes // max(1, bytes_per_row))
+    return [slice(start, start + step) for start in range(0, n_rows, step)]
+
+def _as_coordinates(pos3D) -> np.ndarray:
+    """Grid coordinates wide enough to pack cells and baselines (the compact int16 ones are widened to int32)."""
+    pos3D = np.asarray(pos3D)
+    return pos3D if pos3D.dtype.itemsize >= 4 else pos3D.astype(np.int32)
+
+def golomb_grids(pos3D, grid_size: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Builds the XY, XZ and YZ Golomb grids (plane occupancy) of a set of satellites on the grid.
+
+    Args:
+        pos3D (`np.ndarray` (n, 3)): integer grid coordinates of the satellites.
+        grid_size (`int`): size of the Golomb grid.
+
+    Returns:
+        `tuple[np.ndarray, np.ndarray, np.ndarray]`: (xy, xz, yz) grids of shape (grid_size, grid_size).
+    """
+    pos3D = np.asarray(pos3D, dtype=int).reshape(-1, 3)
+    grids = []
+    for u, v in PLANES:
+        grid = np.zeros((grid_size, grid_size))
+        grid[pos3D[:, u], pos3D[:, v]] = 1
+        grids.append(grid)
+    return tuple(grids)
+
+def count_autocorrelation_cells(pos3D, grid_size: int) -> tuple[int, int, int]:
+    """
+    Counts the nonzero cells of the autocorrelation of the XY, XZ and YZ Golomb grids.
+
+    A cell of the autocorrelation is nonzero if and only if its offset is the difference vector
+    (baseline) of two occupied cells, so we count the distinct pairwise differences instead of
+    correlating the grids: the cost scales with the number of satellites, not with the grid size.
+    The 3D differences are computed once and projected on the three planes.
+
+    Args:
+        pos3D (`np.ndarray` (n, 3)): integer grid coordinates of the satellites inside the grid.
+        grid_size (`int`): size of the Golomb grid.
+
+    Returns:
+        `tuple[int, int, int]`: number of nonzero autocorrelation cells on (xy, xz, yz).
+    """
+    pos3D = np.asarray(pos3D, dtype=int).reshape(-1, 3)
+    if len(pos3D) == 0:
+        return (0, 0, 0)
+
+    i, j = np.triu_indices(len(pos3D), 1)
+    diff = pos3D[j] - pos3D[i]
+    size = 2 * grid_size - 1
+
+    counts = []
+    for u, v in PLANES:
+        # Pack (du, dv) into a single integer: key(-d) == -key(d), so |key| identifies the pair {d, -d}
+        keys = np.abs(diff[:, u] * size + diff[:, v])
+        distinct = np.unique(keys)
+        n_distinct = len(distinct) - (len(distinct) > 0 and distinct[0] == 0)
+        # Every nonzero baseline appears with both signs, plus the zero offset at the center
+        counts.append(2 * int(n_distinct) + 1)
+    return tuple(counts)
+
+def count_autocorrelation_cells_batch(pos3D, valid, grid_size: int, chunk_bytes: int = CHUNK_BYTES) -> np.ndarray:
+    """
+    Batched version of `count_autocorrelation_cells` for many sets of satellites of the same size.
+
+    Time is O(N^2 log N) per set of satellites and does not depend on the grid size; memory is bounded by
+    processing the sets in chunks (about 96 bytes per pair of satellites are needed at once).
+
+    Args:
+        pos3D (`np.ndarray` (..., 3, N)): integer grid coordinates of the satellites.
+        valid (`np.ndarray` (..., N)): True for the satellites inside the grid (the others are ignored).
+        grid_size (`int`): size of the Golomb grid.
+        chunk_bytes (`int`, optional): memory budget of the temporaries.
+
+    Returns:
+        `np.ndarray` (..., 3): number of nonzero autocorrelation cells on (xy, xz, yz).
+    """
+    pos3D = _as_coordinates(pos3D)
+    valid = np.asarray(valid, dtype=bool)
+    batch_shape, N = valid.shape[:-1], valid.shape[-1]
+    pos3D = pos3D.reshape(-1, 3, N)
+    valid = valid.reshape(-1, N)
+
+    i, j = np.triu_indices(N, 1)
+    size = 2 * grid_size - 1
+
+    counts = np.empty((len(valid), 3), dtype=int)
+    for rows in _row_chunks(len(valid), 96 * len(i), chunk_bytes):
+        diff = pos3D[rows][:, :, j] - pos3D[rows][:, :, i]
+        pair_valid = valid[rows][:, i] & valid[rows][:, j]
+        for plane, (u, v) in enumerate(PLANES):
+            keys = np.abs(diff[:, u] * size + diff[:, v])
+            # Pairs involving cropped satellites are mapped on the zero offset, which is never counted
+            keys[~pair_valid] = 0
+            keys.sort(axis=1)
+            new_value = np.ones_like(keys, dtype=bool)
+            new_value[:, 1:] = keys[:, 1:] != keys[:, :-1]
+            n_distinct = np.count_nonzero(new_value & (keys != 0), axis=1)
+            counts[rows, plane] = 2 * n_distinct + np.any(valid[rows], axis=1)
+    return counts.reshape(batch_shape + (3,))
+
+def count_autocorrelation_cells_occupancy(pos3D, valid, grid_size: int, chunk_bytes: int = CHUNK_BYTES) -> np.ndarray:
+    """
+    Compact version of `count_autocorrelation_cells_batch`: the baselines are packed in int32 and marked on a
+    uint8 occupancy table of (half) the autocorrelation instead of being sorted.
+
+    Args:
+        pos3D (`np.ndarray` (..., 3, N)): integer grid coordinates of the satellites.
+        valid (`np.ndarray` (..., N)): True for the satellites inside the grid (the others are ignored).
+        grid_size (`int`): size of the Golomb grid.
+        chunk_bytes (`int`, optional): memory budget of the occupancy table and of the temporaries.
+
+    Returns:
+        `np.ndarray` (..., 3): number of nonzero autocorrelation cells on (xy, xz, yz).
+    """
+    pos3D = _as_coordinates(pos3D)
+    valid = np.asarray(valid, dtype=bool)
+    batch_shape, N = valid.shape[:-1], valid.shape[-1]
+    pos3D = pos3D.reshape(-1, 3, N)
+    valid = valid.reshape(-1, N)
+
+    i, j = np.triu_indices(N, 1)
+    size = 2 * grid_size - 1
+    # Packed baselines satisfy |du * size + dv| <= (grid_size - 1) * size + grid_size - 1
+    n_keys = (grid_size - 1) * size + grid_size
+
+    counts = np.empty((len(valid), 3), dtype=int)
+    for rows in _row_chunks(len(valid), n_keys + 24 * len(i), chunk_bytes):
+        diff = np.subtract(pos3D[rows][:, :, j], pos3D[rows][:, :, i], dtype=np.int32)
+        pair_valid = valid[rows][:, i] & valid[rows][:, j]
+        offsets = (np.arange(len(pair_valid), dtype=np.int32) * n_keys)[:, np.newaxis]
+        table = np.empty((len(pair_valid), n_keys), dtype=np.uint8)
+        for plane, (u, v) in enumerate(PLANES):
+            keys = np.abs(diff[:, u] * size + diff[:, v])
+            # Pairs involving cropped satellites are marked on the zero offset, which is never counted
+            keys[~pair_valid] = 0
+            table[:] = 0
+            table.reshape(-1)[keys + offsets] = 1
+            counts[rows, plane] = 2 * np.count_nonzero(table[:, 1:], axis=1) + np.any(valid[rows], axis=1)
+    return counts.reshape(batch_shape + (3,))
+
+def count_autocorrelation_upper_bounds(pos3D, valid, grid_size: int) -> np.ndarray:
+    """
+    Upper bounds of `count_autocorrelation_cells_batch` computed from the occupied cells alone.
+
+    D distinct occupied cells on a plane have at most D(D-1)/2 distinct baselines, each appearing with both
+    signs, plus the zero offset: at most D(D-1)+1 nonzero cells, and never more than the (2*grid_size-1)^2
+    cells of the autocorrelation. Counting the occupied cells only needs a sort of N cells instead of N^2 pairs.
+
+    Args:
+        pos3D (`np.ndarray` (..., 3, N)): integer grid coordinates of the satellites.
+        valid (`np.ndarray` (..., N)): True for the satellites inside the grid (the others are ignored).
+        grid_size (`int`): size of the Golomb grid.
+
+    Returns:
+        `np.ndarray` (..., 3): upper bounds of the number of nonzero autocorrelation cells on (xy, xz, yz).
+    """
+    size = 2 * grid_size - 1
+    n_cells = count_occupied_plane_cells(pos3D, valid, grid_size)
+    return np.minimum(n_cells * (n_cells - 1) + (n_cells > 0), size * size)
+
+def _first_in_cell(cells, valid) -> np.ndarray:
+    """Mask (P, N) keeping one valid satellite per occupied cell of each row of cells (P, N)."""
+    # Cropped satellites are mapped before every cell of the grid
+    cells = np.where(valid, cells, -1)
+    order = np.argsort(cells, axis=1, kind="stable")
+    ordered = np.take_along_axis(cells, order, axis=1)
+    new_cell = ordered >= 0
+    new_cell[:, 1:] &= ordered[:, 1:] != ordered[:, :-1]
+    keep = np.empty_like(new_cell)
+    np.put_along_axis(keep, order, new_cell, axis=1)
+    return keep
+
+def count_occupied_plane_cells(pos3D, valid, grid_size: int) -> np.ndarray:
+    """
+    Counts the distinct cells occupied on the XY, XZ and YZ planes.
+
+    Args:
+        pos3D (`np.ndarray` (..., 3, N)): integer grid coordinates of the satellites.
+        valid (`np.ndarray` (..., N)): True for the satellites inside the grid (the others are ignored).
+        grid_size (`int`): size of the Golomb grid.
+
+    Returns:
+        `np.ndarray` (..., 3): number of occupied cells on (xy, xz, yz).
+    """
+    pos3D = _as_coordinates(pos3D)
+    valid = np.asarray(valid, dtype=bool)
+
+    n_cells = np.empty(valid.shape[:-1] + (3,), dtype=int)
+    for plane, (u, v) in enumerate(PLANES):
+        # Cropped satellites are mapped before every cell of the grid
+        cells = np.where(valid, pos3D[..., u, :] * grid_size + pos3D[..., v, :], -1)
+        cells.sort(axis=-1)
+        n_cells[..., plane] = np.count_nonzero((cells[..., 1:] != cells[..., :-1]) & (cells[..., 1:] >= 0), axis=-1) + (cells[..., 0] >= 0)
+    return n_cells
+
+def count_unique_distances_batch(pos3D, valid, grid_size: int, chunk_bytes: int = CHUNK_BYTES) -> np.ndarray:
+    """
+    Counts, on the XY, XZ and YZ planes, the distances (|du|, |dv|) between the distinct occupied cells
+    which are not repeated by any other pair of cells.
+
+    Args:
+        pos3D (`np.ndarray` (..., 3, N)): integer grid coordinates of the satellites.
+        valid (`np.ndarray` (..., N)): True for the satellites inside the grid (the others are ignored).
+        grid_size (`int`): size of the Golomb grid.
+        chunk_bytes (`int`, optional): memory budget of the temporaries (the sets of satellites are processed in chunks).
+
+    Returns:
+        `np.ndarray` (..., 3): number of unique distances on (xy, xz, yz).
+    """
+    pos3D = _as_coordinates(pos3D)
+    valid = np.asarray(valid, dtype=bool)
+    batch_shape, N = valid.shape[:-1], valid.shape[-1]
+    pos3D = pos3D.reshape(-1, 3, N)
+    valid = valid.reshape(-1, N)
+
+    i, j = np.triu_indices(N, 1)
+    counts = np.empty((len(valid), 3), dtype=int)
+    for rows in _row_chunks(len(valid), 96 * len(i), chunk_bytes):
+        chunk_pos, chunk_valid = pos3D[rows], valid[rows]
+        for plane, (u, v) in enumerate(PLANES):
+            # Distances are taken between distinct points of the plane
+            keep = _first_in_cell(chunk_pos[:, u] * grid_size + chunk_pos[:, v], chunk_valid)
+            # Pack (|du|, |dv|) into a single integer, the pairs not taken are mapped on -1
+            keys = np.abs(chunk_pos[:, u, j] - chunk_pos[:, u, i]) * grid_size + np.abs(chunk_pos[:, v, j] - chunk_pos[:, v, i])
+            keys[~(keep[:, i] & keep[:, j])] = -1
+            keys.sort(axis=1)
+            # A distance is unique when it differs from both its neighbours once sorted
+            unique = keys >= 0
+            unique[:, 1:] &= keys[:, 1:] != keys[:, :-1]
+            unique[:, :-1] &= keys[:, :-1] != keys[:, 1:]
+            counts[rows, plane] = np.count_nonzero(unique, axis=1)
+    return counts.reshape(batch_shape + (3,))
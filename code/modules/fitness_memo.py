@@ -0,0 +1,92 @@
+from collections import OrderedDict
+
+import numpy as np
+
+def grid_signatures(pos3D, valid, grid_size: int) -> list[bytes]:
+    """
+    Canonical signatures of the cells occupied at every observation, independent of the order of the satellites.
+
+    The fill factor only depends on the set of occupied cells at each observation: two satellites in the same
+    cell add no baseline and cropped satellites add none at all. Each cell is flattened to an integer, the
+    cells of each observation are sorted and the repeated ones are replaced by a sentinel (as the cropped
+    ones), so that chromosomes with the same occupied cells get the same bytes.
+
+    Args:
+        pos3D (`np.ndarray` (P, M, 3, N)): integer grid coordinates of the satellites.
+        valid (`np.ndarray` (P, M, N)): True for the satellites inside the grid.
+        grid_size (`int`): size of the Golomb grid.
+
+    Returns:
+        `list[bytes]`: one signature per chromosome.
+    """
+    # Sentinel sorted after every cell of the grid
+    sentinel = grid_size**3
+    pos3D = np.asarray(pos3D, dtype=np.int64)
+    cells = (pos3D[:, :, 0] * grid_size + pos3D[:, :, 1]) * grid_size + pos3D[:, :, 2]
+    cells = np.where(valid, cells, sentinel).astype(np.int32)
+    cells.sort(axis=2)
+    cells[:, :, 1:][cells[:, :, 1:] == cells[:, :, :-1]] = sentinel
+    cells.sort(axis=2)
+    return [row.tobytes() for row in cells]
+
+class FitnessMemo:
+    """
+    Bounded LRU memo of the fill factors at every observation, keyed by `grid_signatures`.
+
+    Continuous chromosomes quantized to the same cells at every observation share the same fitness,
+    so on a hit the counting of the baselines is skipped entirely.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Args:
+            max_size (`int`): maximum number of entries, the least recently used one is evicted first.
+        """
+        if max_size <= 0:
+            raise ValueError("The memo needs a positive max_size")
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: bytes):
+        """Returns the fill factors stored under key (marking them as recently used) or None."""
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: bytes, value) -> None:
+        """Stores the fill factors of a signature, evicting the least recently used entries if full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Empties the memo and resets the statistics."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            `dict`: hits, misses, hit rate, evictions, current and maximum size.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
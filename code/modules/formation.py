@@ -0,0 +1,153 @@
+import numpy as np
+
+def projection_tensor(stms, inflation_factor: float = 1.0, inflate_first: bool = False) -> np.ndarray:
+    """
+    Builds the tensor mapping the initial relative states of the satellites to their positions on the grid.
+
+    The chromosome is scaled down by `scaling_factor` before the propagation and the propagated positions are
+    scaled back up by the same factor, which cancels out in this linear map: only the inflation of the grid
+    after the first measurement remains to be folded in.
+
+    Args:
+        stms (`np.ndarray` (M, 6, 6)): state transition matrices at the measurement points.
+        inflation_factor (`float`, optional): the grid is inflated by this factor after the first measurement.
+        inflate_first (`bool`, optional): inflate the grid at the first measurement too.
+
+    Returns:
+        `np.ndarray` (M, 3, 6): positions (in grid units, [-1, 1] inside the grid) per unit of initial state.
+    """
+    epoch_scale = np.full(len(stms), float(inflation_factor))
+    if not inflate_first:
+        epoch_scale[0] = 1.0
+    return np.ascontiguousarray(stms[:, :3, :] / epoch_scale[:, np.newaxis, np.newaxis])
+
+class Formation:
+    """
+    Zero-copy view of a chromosome, or of a population of chromosomes, as the initial relative states of the satellites.
+
+    The chromosome layout [dx_1..dx_N, dy_1..dy_N, dz_1..dz_N, dvx_1..dvx_N, dvy_1..dvy_N, dvz_1..dvz_N] is
+    viewed as a (P, 6, N) array, and the positions at all the measurements come out of a single einsum with
+    the projection tensor (see `projection_tensor`). The result for a chromosome does not depend on the other
+    rows of the population, so single and batched evaluations are bit-identical.
+    """
+
+    def __init__(self, x, n_sat: int, projection: np.ndarray):
+        """
+        Args:
+            x (`np.ndarray` (6N,) or (P, 6N)): chromosome(s).
+            n_sat (`int`): number of satellites N.
+            projection (`np.ndarray` (M, 3, 6)): projection tensor of the problem.
+        """
+        self.state = np.asarray(x, dtype=float).reshape(-1, 6, n_sat)
+        self.projection = projection
+
+    @property
+    def n_sat(self) -> int:
+        return self.state.shape[2]
+
+    def __len__(self) -> int:
+        return self.state.shape[0]
+
+    def positions(self) -> np.ndarray:
+        """
+        Returns:
+            `np.ndarray` (P, M, 3, N): positions of the satellites at each measurement, in grid units.
+        """
+        return np.einsum("kij,pjn->pkin", self.projection, self.state)
+
+    def grid_positions(self, grid_size: int, compact: bool = False):
+        """
+        Interprets the positions at each measurement as points on the grid.
+
+        Args:
+            grid_size (`int`): size of the Golomb grid.
+            compact (`bool`, optional): propagate in float32 and return int16 coordinates. The satellites whose
+                float32 position is too close to a cell boundary (or to the edge of the grid) to be trusted are
+                propagated again in float64, so the cells are exactly the float64 ones.
+
+        Returns:
+            (pos3D (P, M, 3, N), valid (P, M, N)): integer grid coordinates of each satellite and whether the
+            satellite is inside the grid (the others are cropped out).
+        """
+        if not compact:
+            return _quantize(self.positions(), grid_size)
+
+        pos3D, valid, uncertain = self._compact_grid_positions(grid_size)
+        # Chromosomes are propagated again as a whole: the float64 kernel does not depend on the other rows
+        rows = np.flatnonzero(np.any(uncertain, axis=(1, 2)))
+        if len(rows):
+            exact_pos, valid[rows] = Formation(self.state[rows], self.n_sat, self.projection).grid_positions(grid_size)
+            pos3D[rows] = np.where(valid[rows][:, :, np.newaxis, :], exact_pos, 0)
+        return pos3D, valid
+
+    def _compact_grid_positions(self, grid_size: int):
+        """
+        Float32 version of `grid_positions`.
+
+        Returns:
+            (pos3D (P, M, 3, N) int16, valid (P, M, N), uncertain (P, M, N)): the cells and crops in float32,
+            and the satellites for which they may differ from float64.
+        """
+        eps = np.finfo(np.float32).eps
+        state = self.state.astype(np.float32)
+        projection = self.projection.astype(np.float32)
+        points = np.einsum("kij,pjn->pkin", projection, state)
+
+        # Bound of the float32 rounding errors (inputs, 6 products and 5 sums) of each position: |error| <= c eps sum|a_j x_j|
+        scale = np.abs(projection).sum(axis=2)[np.newaxis, :, :, np.newaxis] * np.abs(state).max(axis=(1, 2))[:, np.newaxis, np.newaxis, np.newaxis]
+        error = _COMPACT_GUARD * eps * scale
+
+        # Satellites surely inside (or surely outside) the grid
+        inside = np.all(np.abs(points) < 1 - error - eps, axis=2)
+        outside = np.any(np.abs(points) > 1 + error + eps, axis=2)
+
+        pos3D = points * grid_size / 2
+        pos3D = pos3D + int(grid_size / 2)
+        # Cells too close to an integer boundary, also accounting for the rounding of the scaling above
+        near_boundary = np.abs(pos3D - np.rint(pos3D)) <= error * grid_size / 2 + 2 * eps * grid_size
+        uncertain = (~inside & ~outside) | (inside & np.any(near_boundary, axis=2))
+        # Only the cells inside the grid fit in int16
+        pos3D = np.where(inside[:, :, np.newaxis, :], pos3D, 0).astype(np.int16)
+        return pos3D, inside, uncertain
+
+# Safety factor of the float32 error bound of compact positions (4 is enough for a sum of 6 products)
+_COMPACT_GUARD = 8
+
+def _quantize(points, grid_size: int):
+    """Crops the positions (..., 3, N) outside [-1, 1] and interprets the others as points on the grid."""
+    # Satellites outside [-1,1] are cropped out
+    valid = (np.max(points, axis=-2) < 1) & (np.min(points, axis=-2) > -1)
+    # Interpret now the 3D positions [-1,1] as points on a grid.
+    pos3D = points * grid_size / 2
+    pos3D = pos3D + int(grid_size / 2)
+    return pos3D.astype(int), valid
+
+def compact_report(formation: Formation, grid_size: int) -> dict:
+    """
+    Counts how many cell assignments of the compact mode differ from float64 (see `Formation.grid_positions`).
+
+    Args:
+        formation (`Formation`): population to check, ideally a large random one.
+        grid_size (`int`): size of the Golomb grid.
+
+    Returns:
+        `dict`: number of assignments (satellite at an observation), of assignments differing with float32 alone,
+                of assignments propagated again in float64 (and of chromosomes), and of assignments still
+                differing in the compact mode (which must be 0).
+    """
+    exact_pos, exact_valid = formation.grid_positions(grid_size)
+    pos3D, valid, uncertain = formation._compact_grid_positions(grid_size)
+    compact_pos, compact_valid = formation.grid_positions(grid_size, compact=True)
+
+    def differences(pos3D, valid):
+        # Cropped satellites only need to be cropped in both
+        moved = np.any(pos3D != exact_pos, axis=2) & exact_valid
+        return int(np.count_nonzero((valid != exact_valid) | moved))
+
+    return {
+        "assignments": exact_valid.size,
+        "float32_differences": differences(pos3D, valid),
+        "rechecked_assignments": int(np.count_nonzero(uncertain)),
+        "rechecked_chromosomes": int(np.count_nonzero(np.any(uncertain, axis=(1, 2)))),
+        "compact_differences": differences(compact_pos, compact_valid),
+    }
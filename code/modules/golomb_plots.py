@@ -0,0 +1,300 @@
+""" Plots and simulated interferometric reconstructions of the orbital Golomb problem.
+Kept apart from modules/golomb_problem.py, which loads this module on first use, so that the
+evaluation core only imports numpy. """
+import numpy as np
+import scipy.signal
+import PIL.Image
+import SSIM_PIL
+
+from matplotlib import pyplot as plt
+import matplotlib.cm as cm
+
+from modules.fill_factor import golomb_grids
+from modules.formation import Formation, projection_tensor
+from modules.golomb_problem import stm_factory
+
+def plot_fill_factors(udp, epochs, figsize=(15, 10)):
+    """Plots the satellites on the grid at each measurement with the corresponding auto-correlation function and fill factors.
+
+    Args:
+        udp (`orbital_golomb_array`): The orbital Golomb problem.
+        epochs (`list` of (pos3D, f1, f2, f3)): Grid coordinates of the satellites and fill factors (XY, XZ, YZ) at each measurement.
+        figsize (tuple, optional): Figure size. Defaults to (15, 10).
+    """
+    fig = plt.figure(figsize=figsize)
+    gs = fig.add_gridspec(2, udp.n_meas * 3, hspace=0.02, wspace=0.02)
+    fig.suptitle('Placement of satellites (red squares) with respect to mothership (M)\nAutocorrelation matrix and corresponding fill factors.', fontsize=16, fontweight='bold', y=1.05)
+    plt.axis("off")
+    axs = gs.subplots(sharex=False, sharey=False)
+    axs = axs.ravel()
+
+    for k, (pos3D, f1, f2, f3) in enumerate(epochs):
+        # Golomb grids and their autocorrelation are only needed for the figure
+        xy, xz, yz = golomb_grids(pos3D, udp.grid_size)
+        xyC = scipy.signal.correlate(xy, xy, mode="full")
+        xzC = scipy.signal.correlate(xz, xz, mode="full")
+        yzC = scipy.signal.correlate(yz, yz, mode="full")
+
+        # XY
+        # On the first row we plot the Golomb Grids
+        axs[k * udp.n_meas].imshow(xy, cmap=cm.jet, interpolation="nearest", origin='lower')
+        axs[k * udp.n_meas].add_patch(plt.Rectangle((int(udp.grid_size / 2)-0.5, int(udp.grid_size / 2)-0.5), 1, 1, color='black', alpha=0.5))
+        axs[k * udp.n_meas].text( int(udp.grid_size / 2), int(udp.grid_size / 2), 'M', color='white', fontsize=12, ha='center', va='center')
+        axs[k * udp.n_meas].grid(False)
+        axs[k * udp.n_meas].set_xlim(-0.5, udp.grid_size - 0.5)
+        axs[k * udp.n_meas].set_ylim(-0.5, udp.grid_size - 0.5)
+        axs[k * udp.n_meas].axis("off")
+        if k == 0:
+            axs[k * udp.n_meas].set_title(f"1st measurement\nt = 0\nXY plane\n{int(np.sum(xy))} satellites remaining !", color="black")
+        elif k == 1:
+            axs[k * udp.n_meas].set_title(f"2nd measurement\nt = 1 period\nXY plane\n{int(np.sum(xy))} satellites remaining !", color="black")
+        else:
+            axs[k * udp.n_meas].set_title(
+                f"3rd measurement\nt = 2 periods\nXY plane\n{int(np.sum(xy))} satellites remaining !",
+                color="black",
+            )
+
+        # On the second row we plot the autocorrelated Golomb Grids
+        axs[k * udp.n_meas + 3 * udp.n_meas].imshow(xyC, cmap=cm.jet, interpolation="nearest", origin='lower')
+        axs[k * udp.n_meas + 3 * udp.n_meas].grid(False)
+        axs[k * udp.n_meas + 3 * udp.n_meas].axis("off")
+        if k == 0:
+            axs[k * udp.n_meas + 3 * udp.n_meas].set_title(f"fill factor = {f1:1.6f}", color="red")
+        elif k == 1:
+            axs[k * udp.n_meas + 3 * udp.n_meas].set_title(f"fill factor = {f1:1.6f}", color="red")
+        else:
+            axs[k * udp.n_meas + 3 * udp.n_meas].set_title(f"fill factor = {f1:1.6f}", color="red")
+
+        # XZ
+        # On the first row we plot the Golomb Grids
+        axs[k * udp.n_meas + 1].imshow(xz, cmap=cm.jet, interpolation="nearest", origin='lower')
+        axs[k * udp.n_meas + 1].add_patch(plt.Rectangle((int(udp.grid_size / 2)-0.5, int(udp.grid_size / 2)-0.5), 1, 1, color='black', alpha=0.5))
+        axs[k * udp.n_meas + 1].text( int(udp.grid_size / 2), int(udp.grid_size / 2), 'M', color='white', fontsize=12, ha='center', va='center')
+        axs[k * udp.n_meas + 1].grid(False)
+        axs[k * udp.n_meas + 1].set_xlim(-0.5, udp.grid_size - 0.5)
+        axs[k * udp.n_meas + 1].set_ylim(-0.5, udp.grid_size - 0.5)
+        axs[k * udp.n_meas + 1].axis("off")
+        if k == 0:
+            axs[k * udp.n_meas + 1].set_title(f"1st measurement\nt = 0\nXZ plane\n{int(np.sum(xz))} satellites remaining !", color="black")
+        elif k == 1:
+            axs[k * udp.n_meas + 1].set_title(f"2nd measurement\nt = 1 period\nXZ plane\n{int(np.sum(xz))} satellites remaining !", color="black")
+        else:
+            axs[k * udp.n_meas + 1].set_title(f"3rd measurement\nt = 2 periods\nXZ plane\n{int(np.sum(xz))} satellites remaining !", color="black")
+
+        # On the secnd raw we plot the autocorrelated Golomb Grids
+        axs[k * udp.n_meas + 1 + 3 * udp.n_meas].imshow(xzC, cmap=cm.jet, interpolation="nearest", origin='lower')
+        axs[k * udp.n_meas + 1 + 3 * udp.n_meas].grid(False)
+        axs[k * udp.n_meas + 1 + 3 * udp.n_meas].axis("off")
+        if k == 0:
+            axs[k * udp.n_meas + 1 + 3 * udp.n_meas].set_title(
+                f"fill factor = {f2:1.6f}", color="red"
+            )
+        elif k == 1:
+            axs[k * udp.n_meas + 1 + 3 * udp.n_meas].set_title(
+                f"fill factor = {f2:1.6f}", color="red"
+            )
+        else:
+            axs[k * udp.n_meas + 1 + 3 * udp.n_meas].set_title(
+                f"fill factor = {f2:1.6f}", color="red"
+            )
+
+        # XZ
+        # On the first raw we plot the Golomb Grids
+        axs[k * udp.n_meas + 2].imshow(
+            yz, cmap=cm.jet, interpolation="nearest", origin="lower"
+        )
+        axs[k * udp.n_meas + 2].add_patch(
+            plt.Rectangle(
+                (int(udp.grid_size / 2) - 0.5, int(udp.grid_size / 2) - 0.5),
+                1,
+                1,
+                color="black",
+                alpha=0.5,
+            )
+        )
+        axs[k * udp.n_meas + 2].text(
+            int(udp.grid_size / 2),
+            int(udp.grid_size / 2),
+            "M",
+            color="white",
+            fontsize=12,
+            ha="center",
+            va="center",
+        )
+        axs[k * udp.n_meas + 2].grid(False)
+        axs[k * udp.n_meas + 2].set_xlim(-0.5, udp.grid_size - 0.5)
+        axs[k * udp.n_meas + 2].set_ylim(-0.5, udp.grid_size - 0.5)
+        axs[k * udp.n_meas + 2].axis("off")
+
+        if k == 0:
+            axs[k * udp.n_meas + 2].set_title(
+                f"1st measurement\nt = 0\nYZ plane\n{int(np.sum(yz))} satellites remaining !",
+                color="black",
+            )
+        elif k == 1:
+            axs[k * udp.n_meas + 2].set_title(
+                f"2nd measurement\nt = 1 period\nYZ plane\n{int(np.sum(yz))} satellites remaining !",
+                color="black",
+            )
+        else:
+            axs[k * udp.n_meas + 2].set_title(
+                f"3rd measurement\nt = 2 periods\nYZ plane\n{int(np.sum(yz))} satellites remaining !",
+                color="black",
+            )
+
+        # On the secnd raw we plot the autocorrelated Golomb Grids
+        axs[k * udp.n_meas + 2 + 3 * udp.n_meas].imshow(
+            yzC, cmap=cm.jet, interpolation="nearest", origin="lower"
+        )
+        axs[k * udp.n_meas + 2 + 3 * udp.n_meas].grid(False)
+        axs[k * udp.n_meas + 2 + 3 * udp.n_meas].axis("off")
+        if k == 0:
+            axs[k * udp.n_meas + 2 + 3 * udp.n_meas].set_title(
+                f"fill factor = {f3:1.6f}", color="red"
+            )
+        elif k == 1:
+            axs[k * udp.n_meas + 2 + 3 * udp.n_meas].set_title(
+                f"fill factor = {f3:1.6f}", color="red"
+            )
+        else:
+            axs[k * udp.n_meas + 2 + 3 * udp.n_meas].set_title(
+                f"fill factor = {f3:1.6f}", color="red"
+            )
+    plt.show()
+
+def ssim_scores(I_r_images, image_path):
+    """Structural similarity between an image and its simulated reconstructions.
+
+    Args:
+        I_r_images (`list` of `np.ndarray`): Reconstructed images (see `simulated_reconstruction`).
+        image_path (str): Path of the original image.
+    Returns:
+        `list[float]`: SSIM of each reconstruction.
+    """
+    # Now we open up the main image and resize it to match the first reconstructed image dimensions
+    I_o = PIL.Image.open(image_path).resize(I_r_images[0].shape[::-1])
+    # We gonna convert those reconstructed images to grayscale, feel me?
+    rec_images_bw = [PIL.Image.fromarray(img.astype('uint8'), mode='L') for img in I_r_images]
+    # Compare dem similarity values between the images, ya dig?
+    return [SSIM_PIL.compare_ssim(I_o, rec_img, GPU=False) for rec_img in rec_images_bw]
+
+def simulated_reconstruction(udp, x, M=100, grid_size=256, image_path="../data/nebula.jpg", plot_image=True):
+    """Simulates the interferometric reconstruction of an image by the formation (see `orbital_golomb_array.plot_simulated_reconstruction`).
+
+    Args:
+        udp (`orbital_golomb_array`): The orbital Golomb problem.
+        x (`list` of length N): Chromosome contains initial relative positions and velocities of each satellite.
+        M (`int`): Number of interferometric measurements performed along the trajectory.
+        grid_size (int, optional): Size of the Golomb grid of the reconstruction. Defaults to 256.
+        image_path (str, optional): Path of the image to reconstruct. Defaults to "../data/nebula.jpg".
+        plot_image (bool, optional): Plot the reconstructions (otherwise they are returned). Defaults to True.
+    """
+
+    #  Time of flight for the measurements
+    T = udp.T
+
+    _, stms = stm_factory(udp.ic, T, udp.mu, M, udp.verbose)
+
+    # 1) View the chromosome as the (x, y, z, vx, vy, vz) of the satellites and propagate them to the measurment points.
+    # We do this accounting for the formation size, and for an added factor allowing the formation to spread (at every observation)
+    rel_pos = Formation(x, udp.n_sat, projection_tensor(stms, udp.inflation_factor, inflate_first=True)).positions()[0]
+
+    # For each observation point we construct the corresponding Golomb Array
+    gs_xy = []  # This will contain all the Golomb Arrays at each observation point
+    g_xy = np.zeros(
+        (grid_size, grid_size)
+    )  # This will contain all the positions cumulatively (for plotting)
+
+    # For each observation point we construct the corresponding Golomb Array
+    gs_xz = []  # This will contain all the Golomb Arrays at each observation point
+    g_xz = np.zeros(
+        (grid_size, grid_size)
+    )  # This will contain all the positions cumulatively (for plotting)
+
+    # For each observation point we construct the corresponding Golomb Array
+    gs_yz = []  # This will contain all the Golomb Arrays at each observation point
+    g_yz = np.zeros(
+        (grid_size, grid_size)
+    )  # This will contain all the positions cumulatively (for plotting)
+
+    for k in range(M):
+
+        gs_xy.append(np.zeros((grid_size, grid_size)))
+        gs_xz.append(np.zeros((grid_size, grid_size)))
+        gs_yz.append(np.zeros((grid_size, grid_size)))
+
+        points_3D = rel_pos[k].T
+
+        # and removing the points outside [-1,1] (cropping wavelengths here)
+        points_3D = points_3D[np.max(points_3D, axis=1) < 1 ]
+        points_3D = points_3D[np.min(points_3D, axis=1) > -1]
+
+        # Interpret now the 3D positions [-1,1] as points on a grid.
+        pos3D = (points_3D * grid_size / 2).astype(int)
+        pos3D = pos3D + int(grid_size / 2)
+
+
+        for i, j, k_ in pos3D:
+            gs_xy[k][i, j] = 1
+            g_xy[i, j] = 1
+
+            gs_xz[k][i, k_] = 1
+            g_xz[i, k_] = 1
+
+            gs_yz[k][j, k_] = 1
+            g_yz[j, k_] = 1
+
+    def plot_recon(gs, g, plot=True):
+        # We Simulate the interferometric measurement
+        otf = np.zeros((grid_size * 2 - 1, grid_size * 2 - 1))
+        for one_g in gs:
+            tmp = scipy.signal.correlate(one_g, one_g, mode="full")
+            otf = otf + tmp
+        otf[abs(otf) < 0.1] = 0
+        otf[abs(otf) > 1] = 1
+        otf = np.fft.fftshift(otf)
+
+        I_o = PIL.Image.open(image_path)
+        I_o = np.asarray(I_o.resize((511, 511)))
+        imo_fft = np.fft.fft2(I_o)
+        imr_fft = imo_fft * otf  # Hadamard product here
+        I_r = abs(np.fft.ifft2(imr_fft))
+        if plot is False:
+            return I_r
+        # We plot
+        fig = plt.figure(figsize=(15, 3))
+        ax = fig.subplots(1, 4)
+        ax[0].imshow(I_o, cmap="gray")
+        ax[0].axis("off")
+        ax[0].set_title("Image")
+        ax[1].imshow(I_r, cmap="gray")
+        ax[1].axis("off")
+        ax[1].set_title("Reconstruction")
+        ax[2].imshow(g, cmap="gray")
+        ax[2].axis("off")
+        ax[2].set_title("Golomb Array Traj")
+        ax[3].imshow(otf, cmap="gray")
+        ax[3].axis("off")
+        ax[3].set_title("Optical Transfer Function")
+        plt.show()
+
+    if plot_image is False :
+        return (
+            plot_recon(gs_xy, None, plot=plot_image), 
+            plot_recon(gs_xz, None, plot=plot_image), 
+            plot_recon(gs_yz, None, plot=plot_image)
+        )
+
+    I_r_images = [
+        plot_recon(gs_xy, None, plot=False),
+        plot_recon(gs_xz, None, plot=False),
+        plot_recon(gs_yz, None, plot=False)
+    ]
+    values = ssim_scores(I_r_images, image_path)
+    # Now let's spit out those values for ya
+    print('XY\t''SSIM = %.4f%%' %(values[0]*100))
+    plot_recon(gs_xy, g_xy)
+    print('XZ\t''SSIM = %.4f%%' %(values[1]*100))
+    plot_recon(gs_xz, g_xz)
+    print('YZ\t''SSIM = %.4f%%' %(values[2]*100))
+    plot_recon(gs_yz, g_yz)
@@ -1,17 +1,26 @@
 # This Source Code is based on European Space Agency: SpOC 3 Interferometric Mission
 
-from itertools import combinations
-from collections import Counter
-
-import heyoka as hy
+# The evaluation core only needs numpy: plotting/reconstruction (modules/golomb_plots.py) and the
+# Taylor integrator (modules/cr3bp_integrator.py, heyoka) are imported on first use.
 import numpy as np
-import scipy
 import time
-import PIL
-import SSIM_PIL
-
-from matplotlib import pyplot as plt
-import matplotlib.cm as cm
+import warnings
+
+from modules import stm_cache
+from modules.fill_factor import (
+    count_autocorrelation_cells,
+    count_autocorrelation_cells_batch,
+    count_autocorrelation_cells_occupancy,
+    count_autocorrelation_upper_bounds,
+    count_occupied_plane_cells,
+    count_unique_distances_batch,
+)
+from modules.formation import Formation, projection_tensor, compact_report
+from modules.fitness_memo import FitnessMemo, grid_signatures
+from modules.cell_mapping import solve_cells
+
+# Fitness returned for the candidates which cannot beat the threshold given to the fitness functions
+REJECTED_FITNESS = float("inf")
 
 def propagate_formation(dx0, stm):
     """From some initial (relative) position and velocities returns new (relative) positions at
@@ -26,7 +35,7 @@ def propagate_formation(dx0, stm):
     # We return only the positions
     return dxT.T[:, :3]
 
-def stm_factory(ic, T, mu, M, verbose=True):
+def stm_factory(ic, T, mu, M, verbose=True, tol=1e-16, cache=True):
     """Constructs all the STMS and reference trajectory in a CR3BP dynamics
     Args:
         ic (`np.array` (N, 6)): initial conditions (absolute).
@@ -34,91 +43,81 @@ def stm_factory(ic, T, mu, M, verbose=True):
         mu (`float`): gravity parameter
         M (`int`): number of grid points (observations)
         verbose (boolean): print time it took to build Taylor integrator and STMs
+        tol (`float`): tolerance of the Taylor integrator
+        cache (boolean): load/store the result from/to the on-disk cache (see modules/stm_cache.py)
     Returns:
         (ref_state (M, 6), stms (M,6,6)): the propagated state and stms
     """
-    # ----- We assemble the CR3BP equation of motion --------
-    # The state
-    x, y, z, vx, vy, vz = hy.make_vars("x", "y", "z", "vx", "vy", "vz")
-    xarr = np.array([x, y, z, vx, vy, vz])
-    # The dynamics
-    r_1 = hy.sqrt((x + hy.par[0]) ** 2 + y**2 + z**2)
-    r_2 = hy.sqrt((x - (1 - hy.par[0])) ** 2 + y**2 + z**2)
-    dxdt = vx
-    dydt = vy
-    dzdt = vz
-    dvxdt = (
-        2 * vy
-        + x
-        - (1 - hy.par[0]) * (x + hy.par[0]) / (r_1**3)
-        - hy.par[0] * (x + hy.par[0] - 1) / (r_2**3)
-    )
-    dvydt = -2 * vx + y - (1 - hy.par[0]) * y / (r_1**3) - hy.par[0] * y / (r_2**3)
-    dvzdt = -(1 - hy.par[0]) / (r_1**3) * z - hy.par[0] / (r_2**3) * z
-    # This array contains the expressions (r.h.s.) of our dynamics
-    farr = np.array([dxdt, dydt, dzdt, dvxdt, dvydt, dvzdt])
-
-    # We now compute the variational equations
-    # 1 - Define the symbols
-    symbols_phi = []
-    for i in range(6):
-        for j in range(6):
-            # Here we define the symbol for the variations
-            symbols_phi.append("phi_" + str(i) + str(j))
-    phi = np.array(hy.make_vars(*symbols_phi)).reshape((6, 6))
-
-    # 2 - Compute the gradient
-    dfdx = []
-    for i in range(6):
-        for j in range(6):
-            dfdx.append(hy.diff(farr[i], xarr[j]))
-    dfdx = np.array(dfdx).reshape((6, 6))
-
-    # 3 - Assemble the expressions for the r.h.s. of the variational equations
-    dphidt = dfdx @ phi
-
-    dyn = []
-    for state, rhs in zip(xarr, farr):
-        dyn.append((state, rhs))
-    for state, rhs in zip(phi.reshape((36,)), dphidt.reshape((36,))):
-        dyn.append((state, rhs))
-
-    # These are the initial conditions on the variational equations (the identity matrix)
-    ic_var = np.eye(6).reshape((36,)).tolist()
+    if cache:
+        start_time = time.time()
+        cached = stm_cache.load_stms(ic, T, mu, M, tol)
+        if cached is not None:
+            if verbose:
+                print("--- %s seconds --- to load all stms from the cache" % (time.time() - start_time))
+            return cached
+
+    from modules.cr3bp_integrator import INTEGRATORS
 
-    start_time = time.time()
-    ta = hy.taylor_adaptive(
-        # The ODEs.
-        dyn,
-        # The initial conditions (do not matter, they will change)
-        [0.1] * 6 + ic_var,
-        # Operate below machine precision
-        # and in high-accuracy mode.
-        tol=1e-16,
-    )
-    if verbose:
-        print(
-            "--- %s seconds --- to build the Taylor integrator -- (do this only once)"
-            % (time.time() - start_time)
-        )
-    # We set the Taylor integration param
-    ta.pars[:] = [mu]
-    # We set the ic
-    ta.state[:6] = ic
-    ta.state[6:] = ic_var
-    ta.time = 0.0
     # The time grid
     t_grid = np.linspace(0, T, M)
-    # We integrate
+    # We integrate with the integrator compiled once per process
+    INTEGRATORS.get(tol, verbose)
     start_time = time.time()
-    sol = ta.propagate_grid(t_grid)
+    sol = INTEGRATORS.propagate_grid(ic, t_grid, mu, tol, verbose)
     if verbose:
         print("--- %s seconds --- to construct all stms" % (time.time() - start_time))
 
-    ref_state = sol[4][:, :6]
-    stms = sol[4][:, 6:].reshape(M, 6, 6)
+    ref_state = sol[:, :6]
+    stms = sol[:, 6:].reshape(M, 6, 6)
+    if cache:
+        stm_cache.store_stms(ic, T, mu, M, tol, ref_state, stms)
     return (ref_state, stms)
 
+def monodromy_stm_factory(ic, T, mu, M, period, verbose=True, tol=1e-16, cache=True):
+    """Constructs the STMS and reference trajectory from the monodromy matrix of a periodic reference orbit.
+    When the measurements are a whole number m of periods apart (T = m*period*(M-1)), the STM at the k-th
+    measurement is the (k*m)-th power of the monodromy matrix, so a single one-period integration gives
+    any number of measurements. Other time grids fall back to the direct integration of `stm_factory`.
+    The error of the matrix powers grows with the instability of the orbit (halo orbits drift much faster
+    than DROs), check it with `monodromy_drift` before long formations.
+    Args:
+        ic (`np.array` (N, 6)): initial conditions (absolute) on the periodic orbit.
+        T (`float`): propagation time
+        mu (`float`): gravity parameter
+        M (`int`): number of grid points (observations)
+        period (`float`): period of the reference orbit
+        verbose (boolean): print time it took to build Taylor integrator and STMs
+        tol (`float`): tolerance of the Taylor integrator
+        cache (boolean): load/store the one-period integration from/to the on-disk cache
+    Returns:
+        (ref_state (M, 6), stms (M,6,6)): the propagated state and stms
+    """
+    n_periods = T / (M - 1) / period if M > 1 else 0.0
+    m = int(round(n_periods))
+    if m < 1 or abs(n_periods - m) > 1e-9 * n_periods:
+        # Non-periodic time grid
+        return stm_factory(ic, T, mu, M, verbose, tol, cache)
+
+    ref_state, monodromy = stm_factory(ic, period, mu, 2, verbose, tol, cache)
+    step = np.linalg.matrix_power(monodromy[1], m)
+    stms = np.empty((M, 6, 6))
+    stms[0] = np.eye(6)
+    for k in range(1, M):
+        stms[k] = step @ stms[k - 1]
+    # The reference orbit is periodic: the mothership is back at ic at every measurement
+    return np.tile(ref_state[0], (M, 1)), stms
+
+def monodromy_drift(ic, T, mu, M, period, tol=1e-16):
+    """Drift of the STMS built by `monodromy_stm_factory` against the direct integration of `stm_factory`
+    Args:
+        ic, T, mu, M, period, tol: see `monodromy_stm_factory`
+    Returns:
+        np.array (M,): relative error (Frobenius norm) of the STM at each measurement
+    """
+    _, direct = stm_factory(ic, T, mu, M, verbose=False, tol=tol)
+    _, stms = monodromy_stm_factory(ic, T, mu, M, period, verbose=False, tol=tol)
+    return np.linalg.norm(stms - direct, axis=(1, 2)) / np.linalg.norm(direct, axis=(1, 2))
+
 class orbital_golomb_array:
     def __init__(
         self,
@@ -130,7 +129,13 @@ class orbital_golomb_array:
         scaling_factor=1e-4,
         inflation_factor=1.5,
         grid_size=20,
-        verbose = True
+        verbose = True,
+        use_stm_cache = True,
+        period = None,
+        stm_method = "integrate",
+        memo_size = 0,
+        backend = "numpy",
+        compact = False
     ):
         """Constructs a UDP (User Defined Problem) compatible with pagmo/pygmo and representing the design
         of a ballistic formation flight around a nominal CR3BP trajectory, able to perform a good interferometric
@@ -147,6 +152,16 @@ class orbital_golomb_array:
             inflation_factor (`float`, optional): The allowed formation inflation. (outside this radius satellites are no longer considered)
             grid_size (int, optional): Size of the Golomb grid.
             verbose (boolean): print time it took to build Taylor integrator and STMs
+            use_stm_cache (boolean): reuse the STMs stored on disk by previous constructions (see modules/stm_cache.py)
+            period (`float`, optional): Period of the reference orbit (needed by stm_method="monodromy").
+            stm_method (`str`, optional): "integrate" integrates the STMs up to T, "monodromy" builds them from
+                             powers of the monodromy matrix (see `monodromy_stm_factory`). Defaults to "integrate".
+            memo_size (`int`, optional): Remember the fitness of up to memo_size cell assignments (see modules/fitness_memo.py).
+                             Defaults to 0 (disabled).
+            backend (`str`, optional): "numpy", or "numba" for the compiled kernels of modules/numba_kernels.py
+                             (falls back to numpy when numba is not installed). Defaults to "numpy".
+            compact (boolean, optional): Compact evaluation mode: float32 propagation (checked in float64 near the cell
+                             boundaries), int16 cells and uint8 occupancy of the baselines (see `compact_report`). Defaults to False.
         """
         # Init data members
         self.n_sat = n_sat
@@ -159,9 +174,47 @@ class orbital_golomb_array:
         self.inflation_factor = inflation_factor
         self.verbose = verbose
         self.distance_limit_weight = 1/n_sat
+        self.period = period
+        self.stm_method = stm_method
 
         # We construct the various STMs and reference trajectory
-        self.ref_state, self.stms = stm_factory(ic, T, mu, n_meas, self.verbose)
+        if stm_method == "integrate":
+            self.ref_state, self.stms = stm_factory(ic, T, mu, n_meas, self.verbose, cache=use_stm_cache)
+        elif stm_method == "monodromy":
+            if period is None:
+                raise ValueError("stm_method='monodromy' requires the period of the reference orbit")
+            self.ref_state, self.stms = monodromy_stm_factory(ic, T, mu, n_meas, period, self.verbose, cache=use_stm_cache)
+        else:
+            raise ValueError(f"Unknown stm_method '{stm_method}', expected 'integrate' or 'monodromy'")
+
+        # Maps the initial relative states to the positions on the grid at every observation (see modules/formation.py)
+        self.projection = projection_tensor(self.stms, inflation_factor)
+
+        # Evaluation backend, numba is only imported when requested
+        if backend not in ("numpy", "numba"):
+            raise ValueError(f"Unknown backend '{backend}', expected 'numpy' or 'numba'")
+        if backend == "numba":
+            from modules import numba_kernels
+            if not numba_kernels.NUMBA_AVAILABLE:
+                warnings.warn("numba is not installed, falling back to the numpy backend")
+                backend = "numpy"
+        self.backend = backend
+        self.compact = compact
+
+        # Chromosomes quantized to the same cells share the same fitness: optionally remember the last ones
+        self.memo = FitnessMemo(memo_size) if memo_size > 0 else None
+        # Outcome of the evaluations against a threshold (see `pruning_stats`)
+        self.threshold_stats = {"evaluations": 0, "pruned": 0, "rejected": 0}
+
+    def formation(self, x, n_sat=None):
+        """Zero-copy `Formation` view of a chromosome or of a population of chromosomes (one per row)."""
+        return Formation(x, self.n_sat if n_sat is None else n_sat, self.projection)
+
+    def stm_drift(self):
+        """Relative error of the monodromy STMs against direct integration at each measurement (see `monodromy_drift`)."""
+        if self.period is None:
+            raise ValueError("The period of the reference orbit is needed to build the monodromy STMs")
+        return monodromy_drift(self.ic, self.T, self.mu, self.n_meas, self.period)
 
     # Mandatory method in the UDP pygmo interface
     # (returns the lower and upper bound of each component in the chromosome)
@@ -182,8 +235,91 @@ class orbital_golomb_array:
     # Mandatory method in the UDP pygmo interface
     # (returns the fitness of the chromosome [obj1, obj2 ..., ec1, ec2, ...,iec1, iec2...]
     def fitness(self, x):
+        if self.memo is not None or self.backend != "numpy":
+            # Same values as fitness_impl, through the memo or the compiled kernels
+            return self.fitness_batch(x)[0].tolist()
         return self.fitness_impl(x)
 
+    def pruning_stats(self):
+        """Outcome of the evaluations against a threshold: how many were pruned by the upper bounds of the fill
+        factors before counting any baseline, and how many were rejected after counting some observations."""
+        stats = dict(self.threshold_stats)
+        n = stats["evaluations"]
+        stats["pruned_rate"] = stats["pruned"] / n if n else 0.0
+        stats["rejected_rate"] = stats["rejected"] / n if n else 0.0
+        return stats
+
+    def _fill_factor_upper_bounds(self, pos3D, valid):
+        """Upper bounds of the fill factors (..., n_meas) from the number of occupied cells (see `count_autocorrelation_upper_bounds`)."""
+        size = 2 * self.grid_size - 1
+        f = count_autocorrelation_upper_bounds(pos3D, valid, self.grid_size) / size / size
+        return f[..., 0] + f[..., 1] + f[..., 2]
+
+    def sample_population(self, n_samples: int, seed=None):
+        """Random chromosomes (n_samples, 6N) within the bounds, log-uniformly shrunk so that from none to all the satellites are in the grid."""
+        rng = np.random.default_rng(seed)
+        lower, upper = self.get_bounds()
+        X = rng.uniform(lower, upper, (n_samples, len(lower)))
+        return X * 10 ** rng.uniform(-2, 0, (n_samples, 1))
+
+    def compact_report(self, n_samples: int = 100000, seed: int = 0, chunk: int = 5000):
+        """Validation of the compact mode on random chromosomes: cell assignments differing from float64 (see
+        `formation.compact_report`) and fitness values differing from the default evaluation.
+        The chromosomes are evaluated chunk at a time to bound the memory."""
+        X = self.sample_population(n_samples, seed)
+        report = dict()
+        compact = self.compact
+        try:
+            for start in range(0, n_samples, chunk):
+                X_chunk = X[start : start + chunk]
+                counts = compact_report(self.formation(X_chunk), self.grid_size)
+                self.compact = False
+                expected = self.fitness_batch(X_chunk)
+                self.compact = True
+                counts["fitness_differences"] = int(np.count_nonzero(self.fitness_batch(X_chunk) != expected))
+                for key, value in counts.items():
+                    report[key] = report.get(key, 0) + value
+        finally:
+            self.compact = compact
+        return report
+
+    def check_backend(self, n_samples: int = 10000, seed: int = 0):
+        """Compares the compiled kernels with the numpy implementation on random chromosomes (see `numba_kernels.check_backend`)."""
+        from modules.numba_kernels import check_backend
+        return check_backend(self, n_samples, seed)
+
+    def chromosome_from_cells(self, cells, x0=None):
+        """
+        Chromosome whose satellites land in the given cells at every observation (see `cell_mapping.solve_cells`).
+
+        Args:
+            cells (`np.ndarray` (N, n_meas, 3)): target cell of each satellite at each observation, any number N of satellites.
+            x0 (`np.ndarray` (6N,), optional): chromosome whose components are kept for the satellites which cannot
+                reach their targets. Defaults to the least-squares states of those satellites.
+
+        Returns:
+            (x (6N,), infeasible): chromosome and indices of the satellites which do not land in their target cells.
+        """
+        cells = np.asarray(cells, dtype=int)
+        if cells.ndim != 3 or cells.shape[1:] != (self.n_meas, 3):
+            raise ValueError(f"The target cells must have shape (N, {self.n_meas}, 3)")
+        n_sat = len(cells)
+        # Bounds of the 6 components (the same for every satellite)
+        lower, upper = (np.reshape(bound, (6, self.n_sat))[:, 0] for bound in self.get_bounds())
+        states, feasible, _ = solve_cells(self.projection, cells, self.grid_size, (lower, upper))
+        if x0 is not None:
+            states[~feasible] = np.reshape(x0, (6, n_sat)).T[~feasible]
+        x = states.T.reshape(-1)
+        # Final check through the same propagation and quantization as the fitness
+        pos3D, valid = self.grid_positions(x, n_sat)
+        landed = np.all(valid[0], axis=0) & np.all(pos3D[0] == cells.transpose(1, 2, 0), axis=(0, 1))
+        landed &= np.all((states >= lower) & (states <= upper), axis=1)
+        return x, np.flatnonzero(~landed)
+
+    def memo_stats(self):
+        """Hit-rate statistics of the fitness memo (see `FitnessMemo.stats`), None if the memo is disabled."""
+        return None if self.memo is None else self.memo.stats()
+
     # Plots the representation of the chromosome in several graphs
     def plot(self, x, figsize=(25,7)):
         return self.fitness_impl(x, plotting=True, figsize=figsize)
@@ -201,143 +337,9 @@ class orbital_golomb_array:
             grid_size (int, optional): _description_. Defaults to 256.
             image_path (str, optional): _description_. Defaults to "data/nebula.jpg".
         """        
-
-        #  Time of flight for the measurements
-        T = self.T
-
-        _, stms = stm_factory(self.ic, T, self.mu, M, self.verbose)
-
-        # 1) Decode the chromosomes into (x, y, z, vx, vy, vz) of the satellites.
-        N = self.n_sat
-
-        dx0 = np.array(
-            [(i, j, k, p, m, n) for (i, j, k, p, m, n) in zip(x[      : N], 
-                                                              x[N     : 2 * N], 
-                                                              x[2 * N : 3 * N],
-                                                              x[3 * N : 4 * N],
-                                                              x[4 * N : 5 * N],
-                                                              x[5 * N : ],
-                                                              )]
-        )
-
-
-        # We now propagate all these relative positions to the measurment points. We do this accounting for the formation size
-        rel_pos = []
-        for stm in stms:
-            # We scale the initial positions and velocities
-            d_ic = dx0 * self.scaling_factor
-            fc = propagate_formation(d_ic, stm)
-            # We store the relative positions in the original 'units'
-            rel_pos.append(fc / self.scaling_factor)
-        rel_pos = np.array(rel_pos)
-
-        # For each observation point we construct the corresponding Golomb Array
-        gs_xy = []  # This will contain all the Golomb Arrays at each observation point
-        g_xy = np.zeros(
-            (grid_size, grid_size)
-        )  # This will contain all the positions cumulatively (for plotting)
-
-        # For each observation point we construct the corresponding Golomb Array
-        gs_xz = []  # This will contain all the Golomb Arrays at each observation point
-        g_xz = np.zeros(
-            (grid_size, grid_size)
-        )  # This will contain all the positions cumulatively (for plotting)
-
-        # For each observation point we construct the corresponding Golomb Array
-        gs_yz = []  # This will contain all the Golomb Arrays at each observation point
-        g_yz = np.zeros(
-            (grid_size, grid_size)
-        )  # This will contain all the positions cumulatively (for plotting)
-
-        for k in range(M):
-
-            gs_xy.append(np.zeros((grid_size, grid_size)))
-            gs_xz.append(np.zeros((grid_size, grid_size)))
-            gs_yz.append(np.zeros((grid_size, grid_size)))
-
-            points_3D = rel_pos[k]                
-            # Account for an added factor allowing the formation to spread.
-            points_3D = points_3D / (self.inflation_factor) 
-
-            # and removing the points outside [-1,1] (cropping wavelengths here)
-            points_3D = points_3D[np.max(points_3D, axis=1) < 1 ]
-            points_3D = points_3D[np.min(points_3D, axis=1) > -1]
-
-            # Interpret now the 3D positions [-1,1] as points on a grid.
-            pos3D = (points_3D * grid_size / 2).astype(int)
-            pos3D = pos3D + int(grid_size / 2)
-            
-
-            for i, j, k_ in pos3D:
-                gs_xy[k][i, j] = 1
-                g_xy[i, j] = 1
-
-                gs_xz[k][i, k_] = 1
-                g_xz[i, k_] = 1
-
-                gs_yz[k][j, k_] = 1
-                g_yz[j, k_] = 1
-
-        def plot_recon(gs, g, plot=True):
-            # We Simulate the interferometric measurement
-            otf = np.zeros((grid_size * 2 - 1, grid_size * 2 - 1))
-            for one_g in gs:
-                tmp = scipy.signal.correlate(one_g, one_g, mode="full")
-                otf = otf + tmp
-            otf[abs(otf) < 0.1] = 0
-            otf[abs(otf) > 1] = 1
-            otf = np.fft.fftshift(otf)
-
-            I_o = PIL.Image.open(image_path)
-            I_o = np.asarray(I_o.resize((511, 511)))
-            imo_fft = np.fft.fft2(I_o)
-            imr_fft = imo_fft * otf  # Hadamard product here
-            I_r = abs(np.fft.ifft2(imr_fft))
-            if plot is False:
-                return I_r
-            # We plot
-            fig = plt.figure(figsize=(15, 3))
-            ax = fig.subplots(1, 4)
-            ax[0].imshow(I_o, cmap="gray")
-            ax[0].axis("off")
-            ax[0].set_title("Image")
-            ax[1].imshow(I_r, cmap="gray")
-            ax[1].axis("off")
-            ax[1].set_title("Reconstruction")
-            ax[2].imshow(g, cmap="gray")
-            ax[2].axis("off")
-            ax[2].set_title("Golomb Array Traj")
-            ax[3].imshow(otf, cmap="gray")
-            ax[3].axis("off")
-            ax[3].set_title("Optical Transfer Function")
-            plt.show()
-
-        if plot_image is False :
-            return (
-                plot_recon(gs_xy, None, plot=plot_image), 
-                plot_recon(gs_xz, None, plot=plot_image), 
-                plot_recon(gs_yz, None, plot=plot_image)
-            )
-
-        I_r_images = [
-            plot_recon(gs_xy, None, plot=False),
-            plot_recon(gs_xz, None, plot=False),
-            plot_recon(gs_yz, None, plot=False)
-        ]
-        # Now we open up the main image and resize it to match the first reconstructed image dimensions
-        I_o = PIL.Image.open(image_path).resize(I_r_images[0].shape[::-1])
-        # We gonna convert those reconstructed images to grayscale, feel me?
-        rec_images_bw = [PIL.Image.fromarray(img.astype('uint8'), mode='L') for img in I_r_images]
-        # Compare dem similarity values between the images, ya dig?
-        values = [SSIM_PIL.compare_ssim(I_o, rec_img, GPU=False) for rec_img in rec_images_bw]
-        # Now let's spit out those values for ya
-        print('XY\t''SSIM = %.4f%%' %(values[0]*100))
-        plot_recon(gs_xy, g_xy)
-        print('XZ\t''SSIM = %.4f%%' %(values[1]*100))
-        plot_recon(gs_xz, g_xz)
-        print('YZ\t''SSIM = %.4f%%' %(values[2]*100))
-        plot_recon(gs_yz, g_yz)
-
+        # Plotting, reconstruction and SSIM are loaded on first use
+        from modules.golomb_plots import simulated_reconstruction
+        return simulated_reconstruction(self, x, M, grid_size, image_path, plot_image)
 
     # Here is where the action takes place
     def fitness_impl(
@@ -348,6 +350,7 @@ class orbital_golomb_array:
         return_all_n_meas_fillfactor: bool = False,
         reduce_fill_if_not_optimal: bool = False,
         limit_distance: int = None,
+        threshold: float = None,
     ):
         """Fitness function
 
@@ -356,93 +359,63 @@ class orbital_golomb_array:
             Example: x = [ dx0_N1, dx0_N2, ..., dx0_NN, dy0_N1, dy0_N2, ..., dy0_NN , ...... , dvz0_N1, dvz0_N2, ..., dvz0_NN]
             plotting (bool, optional): Plot satellites on grid at each measurement and corresponding auto-correlation function and fill factors. Defaults to False.
             figsize (tuple, optional): Figure size. Defaults to (15, 10).
+            threshold (float, optional): Fitness to beat (e.g. the incumbent of a greedy selection). The observations are
+                evaluated starting from the one with fewest satellites in the grid, and the evaluation stops as soon as
+                one of them shows that the fitness is not below threshold: REJECTED_FITNESS is returned instead.
+                Before counting any baseline, the upper bounds of the fill factors given by the occupied cells alone
+                are checked against the threshold. Ignored when plotting.
         Returns:
             float: fitness of corresponding chromosome x.
         """        
-        # 1) Decode the chromosomes into (x, y, z, vx, vy, vz) of the satellites.
-        N = self.n_sat
-
-        dx0 = np.array(
-            [(i, j, k, r, m, n) for (i, j, k, r, m, n) in zip(x[      : N], 
-                                                              x[N     : 2 * N], 
-                                                              x[2 * N : 3 * N],
-                                                              x[3 * N : 4 * N],
-                                                              x[4 * N : 5 * N],
-                                                              x[5 * N : ],
-                                                              )]
-        )
-
-        # 2) We now propagate all these relative positions to the measurment points. We do this accounting for the formation size
-        rel_pos = []
-        for stm in self.stms:
-            # We scale the initial positions and velocities
-            d_ic = dx0 * self.scaling_factor
-            fc = propagate_formation(d_ic, stm)
-            # We store the relative positions in the original 'units'
-            rel_pos.append(fc / self.scaling_factor)
-        rel_pos = np.array(rel_pos)
+        # 1) View the chromosome as the (x, y, z, vx, vy, vz) of the satellites and
+        # 2) propagate them to the measurment points, interpreting the positions as points on the grid
+        # (same kernel as fitness_batch, so that both give bit-identical results)
+        grid_pos, grid_valid = self.grid_positions(x)
 
         # 3) At each observation epoch we compute the fill factor
         # See:
         # Memarsadeghi, Nargess, Ryan D. Joseph, John C. Kaufmann, and Byung Suk Lee.
         # "Golomb Patterns, Astrophysics, and Citizen Science Games." IEEE Access 10 (2022): 76125-76135.
 
-        fill_factor = []
-
         if plotting:
-            fig = plt.figure(figsize=figsize)
-            gs = fig.add_gridspec(2, self.n_meas * 3, hspace=0.02, wspace=0.02)
-            fig.suptitle('Placement of satellites (red squares) with respect to mothership (M)\nAutocorrelation matrix and corresponding fill factors.', fontsize=16, fontweight='bold', y=1.05)
-            plt.axis("off")
-            axs = gs.subplots(sharex=False, sharey=False)
-            axs = axs.ravel()
-
-        for k in range(self.n_meas):
-
-            points_3D = rel_pos[k]   
-            # Account for an added factor allowing the formation to spread. (Except for first observation, k == 0)
-            if k != 0:
-                points_3D = points_3D / (self.inflation_factor) 
-
-            # and removing the points outside [-1,1] (cropping wavelengths here)
-            points_3D = points_3D[np.max(points_3D, axis=1) < 1 ]
-            points_3D = points_3D[np.min(points_3D, axis=1) > -1]
-
-            # Interpret now the 3D positions [-1,1] as points on a grid.
-            pos3D = (points_3D * self.grid_size / 2)
-            pos3D = pos3D + int(self.grid_size / 2)
-            pos3D = pos3D.astype(int)
+            threshold = None
+        if threshold is None:
+            epochs = range(self.n_meas)
+        else:
+            self.threshold_stats["evaluations"] += 1
+            # Bound first: the reduced fill factors and the distance penalty can only lower the fill factors
+            if np.any(-self._fill_factor_upper_bounds(grid_pos[0], grid_valid[0]) >= threshold):
+                self.threshold_stats["pruned"] += 1
+                return [REJECTED_FITNESS] * (self.n_meas if return_all_n_meas_fillfactor else 1)
+            # Cheapest to fail first: fewer satellites in the grid mean fewer baselines (and less counting)
+            epochs = np.argsort(np.count_nonzero(grid_valid[0], axis=1), kind="stable")
+
+        fill_factor = [None] * self.n_meas
+        plotted = []  # Grid coordinates and fill factors at each observation (for plotting)
+
+        for k in epochs:
+
+            # Grid coordinates (N, 3) of the satellites inside [-1,1] (cropping wavelengths here)
+            pos3D = grid_pos[0, k][:, grid_valid[0, k]].T
 
             # Compute uv plane fill factor
-            # Here we use the (https://stackoverflow.com/questions/62026550/why-does-scipy-signal-correlate2d-use-such-an-inefficient-algorithm)
-            # correlate and ot correlate2d. We must then consider a threshold to define zero as the frequency domain inversion has numerical roundoffs
-
-            EYE = np.zeros((self.grid_size, self.grid_size, self.grid_size))
-            for i, j, k_ in pos3D:
-                EYE[i, j, k_] = 1
-            xy = np.max(EYE, axis = (2,))
-            xz = np.max(EYE, axis = (1,))
-            yz = np.max(EYE, axis = (0,))
-
-            xyC = scipy.signal.correlate(xy, xy, mode="full")
-            xzC = scipy.signal.correlate(xz, xz, mode="full")
-            yzC = scipy.signal.correlate(yz, yz, mode="full")
-            xyC[abs(xyC < 1e-8)] = 0
-            xzC[abs(xzC < 1e-8)] = 0
-            yzC[abs(yzC < 1e-8)] = 0
-
-            f1 = np.count_nonzero(xyC) / xyC.shape[0] / xyC.shape[1]
-            f2 = np.count_nonzero(xzC) / xzC.shape[0] / xzC.shape[1]
-            f3 = np.count_nonzero(yzC) / yzC.shape[0] / yzC.shape[1]
+            # The nonzero cells of the autocorrelation of a Golomb grid are exactly the distinct baselines
+            # (difference vectors) between its occupied cells, so we count them without correlating the grids
+            n_xy, n_xz, n_yz = count_autocorrelation_cells(pos3D, self.grid_size)
+            size = 2 * self.grid_size - 1
+
+            f1 = n_xy / size / size
+            f2 = n_xz / size / size
+            f3 = n_yz / size / size
 
             limit_distance_value = 0
             if limit_distance is not None:
                 center = int(self.grid_size / 2)
-                for i,j,k in pos3D :
+                for i,j,k_ in pos3D :
                     if (
                             abs(center - i) <= limit_distance
                         and abs(center - j) <= limit_distance
-                        and abs(center - k) <= limit_distance
+                        and abs(center - k_) <= limit_distance
                     ) is False :
                         limit_distance_value+=1
 
@@ -454,138 +427,22 @@ class orbital_golomb_array:
                 f2 = f2 * (alpha_f2/size)
                 f3 = f3 * (alpha_f3/size)
 
-            fill_factor.append(
+            fill_factor[k] = (
                 (f1 + f2 + f3) - (limit_distance_value * self.distance_limit_weight)
             )  # Save sum of three fill factors at this observation
             
             if plotting:
-                # XY
-                # On the first row we plot the Golomb Grids
-                axs[k * self.n_meas].imshow(xy, cmap=cm.jet, interpolation="nearest", origin='lower')
-                axs[k * self.n_meas].add_patch(plt.Rectangle((int(self.grid_size / 2)-0.5, int(self.grid_size / 2)-0.5), 1, 1, color='black', alpha=0.5))
-                axs[k * self.n_meas].text( int(self.grid_size / 2), int(self.grid_size / 2), 'M', color='white', fontsize=12, ha='center', va='center')
-                axs[k * self.n_meas].grid(False)
-                axs[k * self.n_meas].set_xlim(-0.5, self.grid_size - 0.5)
-                axs[k * self.n_meas].set_ylim(-0.5, self.grid_size - 0.5)
-                axs[k * self.n_meas].axis("off")
-                if k == 0:
-                    axs[k * self.n_meas].set_title(f"1st measurement\nt = 0\nXY plane\n{int(np.sum(xy))} satellites remaining !", color="black")
-                elif k == 1:
-                    axs[k * self.n_meas].set_title(f"2nd measurement\nt = 1 period\nXY plane\n{int(np.sum(xy))} satellites remaining !", color="black")
-                else:
-                    axs[k * self.n_meas].set_title(
-                        f"3rd measurement\nt = 2 periods\nXY plane\n{int(np.sum(xy))} satellites remaining !",
-                        color="black",
-                    )
-
-                # On the second row we plot the autocorrelated Golomb Grids
-                axs[k * self.n_meas + 3 * self.n_meas].imshow(xyC, cmap=cm.jet, interpolation="nearest", origin='lower')
-                axs[k * self.n_meas + 3 * self.n_meas].grid(False)
-                axs[k * self.n_meas + 3 * self.n_meas].axis("off")
-                if k == 0:
-                    axs[k * self.n_meas + 3 * self.n_meas].set_title(f"fill factor = {f1:1.6f}", color="red")
-                elif k == 1:
-                    axs[k * self.n_meas + 3 * self.n_meas].set_title(f"fill factor = {f1:1.6f}", color="red")
-                else:
-                    axs[k * self.n_meas + 3 * self.n_meas].set_title(f"fill factor = {f1:1.6f}", color="red")
-
-                # XZ
-                # On the first row we plot the Golomb Grids
-                axs[k * self.n_meas + 1].imshow(xz, cmap=cm.jet, interpolation="nearest", origin='lower')
-                axs[k * self.n_meas + 1].add_patch(plt.Rectangle((int(self.grid_size / 2)-0.5, int(self.grid_size / 2)-0.5), 1, 1, color='black', alpha=0.5))
-                axs[k * self.n_meas + 1].text( int(self.grid_size / 2), int(self.grid_size / 2), 'M', color='white', fontsize=12, ha='center', va='center')
-                axs[k * self.n_meas + 1].grid(False)
-                axs[k * self.n_meas + 1].set_xlim(-0.5, self.grid_size - 0.5)
-                axs[k * self.n_meas + 1].set_ylim(-0.5, self.grid_size - 0.5)
-                axs[k * self.n_meas + 1].axis("off")
-                if k == 0:
-                    axs[k * self.n_meas + 1].set_title(f"1st measurement\nt = 0\nXZ plane\n{int(np.sum(xz))} satellites remaining !", color="black")
-                elif k == 1:
-                    axs[k * self.n_meas + 1].set_title(f"2nd measurement\nt = 1 period\nXZ plane\n{int(np.sum(xz))} satellites remaining !", color="black")
-                else:
-                    axs[k * self.n_meas + 1].set_title(f"3rd measurement\nt = 2 periods\nXZ plane\n{int(np.sum(xz))} satellites remaining !", color="black")
-
-                # On the secnd raw we plot the autocorrelated Golomb Grids
-                axs[k * self.n_meas + 1 + 3 * self.n_meas].imshow(xzC, cmap=cm.jet, interpolation="nearest", origin='lower')
-                axs[k * self.n_meas + 1 + 3 * self.n_meas].grid(False)
-                axs[k * self.n_meas + 1 + 3 * self.n_meas].axis("off")
-                if k == 0:
-                    axs[k * self.n_meas + 1 + 3 * self.n_meas].set_title(
-                        f"fill factor = {f2:1.6f}", color="red"
-                    )
-                elif k == 1:
-                    axs[k * self.n_meas + 1 + 3 * self.n_meas].set_title(
-                        f"fill factor = {f2:1.6f}", color="red"
-                    )
-                else:
-                    axs[k * self.n_meas + 1 + 3 * self.n_meas].set_title(
-                        f"fill factor = {f2:1.6f}", color="red"
-                    )
-
-                # XZ
-                # On the first raw we plot the Golomb Grids
-                axs[k * self.n_meas + 2].imshow(
-                    yz, cmap=cm.jet, interpolation="nearest", origin="lower"
-                )
-                axs[k * self.n_meas + 2].add_patch(
-                    plt.Rectangle(
-                        (int(self.grid_size / 2) - 0.5, int(self.grid_size / 2) - 0.5),
-                        1,
-                        1,
-                        color="black",
-                        alpha=0.5,
-                    )
-                )
-                axs[k * self.n_meas + 2].text(
-                    int(self.grid_size / 2),
-                    int(self.grid_size / 2),
-                    "M",
-                    color="white",
-                    fontsize=12,
-                    ha="center",
-                    va="center",
-                )
-                axs[k * self.n_meas + 2].grid(False)
-                axs[k * self.n_meas + 2].set_xlim(-0.5, self.grid_size - 0.5)
-                axs[k * self.n_meas + 2].set_ylim(-0.5, self.grid_size - 0.5)
-                axs[k * self.n_meas + 2].axis("off")
-
-                if k == 0:
-                    axs[k * self.n_meas + 2].set_title(
-                        f"1st measurement\nt = 0\nYZ plane\n{int(np.sum(yz))} satellites remaining !",
-                        color="black",
-                    )
-                elif k == 1:
-                    axs[k * self.n_meas + 2].set_title(
-                        f"2nd measurement\nt = 1 period\nYZ plane\n{int(np.sum(yz))} satellites remaining !",
-                        color="black",
-                    )
-                else:
-                    axs[k * self.n_meas + 2].set_title(
-                        f"3rd measurement\nt = 2 periods\nYZ plane\n{int(np.sum(yz))} satellites remaining !",
-                        color="black",
-                    )
-
-                # On the secnd raw we plot the autocorrelated Golomb Grids
-                axs[k * self.n_meas + 2 + 3 * self.n_meas].imshow(
-                    yzC, cmap=cm.jet, interpolation="nearest", origin="lower"
-                )
-                axs[k * self.n_meas + 2 + 3 * self.n_meas].grid(False)
-                axs[k * self.n_meas + 2 + 3 * self.n_meas].axis("off")
-                if k == 0:
-                    axs[k * self.n_meas + 2 + 3 * self.n_meas].set_title(
-                        f"fill factor = {f3:1.6f}", color="red"
-                    )
-                elif k == 1:
-                    axs[k * self.n_meas + 2 + 3 * self.n_meas].set_title(
-                        f"fill factor = {f3:1.6f}", color="red"
-                    )
-                else:
-                    axs[k * self.n_meas + 2 + 3 * self.n_meas].set_title(
-                        f"fill factor = {f3:1.6f}", color="red"
-                    )
+                plotted.append((pos3D, f1, f2, f3))
+
+            if threshold is not None and -fill_factor[k] >= threshold:
+                # The worst observation can only be worse than this one
+                self.threshold_stats["rejected"] += 1
+                return [REJECTED_FITNESS] * (self.n_meas if return_all_n_meas_fillfactor else 1)
+
         if plotting:
-            plt.show()
+            # Plotting is loaded on first use
+            from modules.golomb_plots import plot_fill_factors
+            plot_fill_factors(self, plotted, figsize)
 
         if return_all_n_meas_fillfactor:
             return [
@@ -594,141 +451,235 @@ class orbital_golomb_array:
         else:  # Default
             return [-min(fill_factor)]  # Return worst of all three observations
 
-    def fitness_distance(
-        self,
-        x,
-    ) :
-        N = self.n_sat
-
-        dx0 = np.array(
-            [
-                (i, j, k, r, m, n)
-                for (i, j, k, r, m, n) in zip(
-                    x[:N],
-                    x[N : 2 * N],
-                    x[2 * N : 3 * N],
-                    x[3 * N : 4 * N],
-                    x[4 * N : 5 * N],
-                    x[5 * N :],
-                )
-            ]
-        )
-
-        rel_pos = []
-        for stm in self.stms:
-            # We scale the initial positions and velocities
-            d_ic = dx0 * self.scaling_factor
-            fc = propagate_formation(d_ic, stm)
-            # We store the relative positions in the original 'units'
-            rel_pos.append(fc / self.scaling_factor)
-        rel_pos = np.array(rel_pos)
-
-        distances_values = []
-
-        for k in range(self.n_meas):
-            points_3D = rel_pos[k]
-            # Account for an added factor allowing the formation to spread. (Except for first observation, k == 0)
-            if k != 0:
-                points_3D = points_3D / (self.inflation_factor)
-
-            # and removing the points outside [-1,1] (cropping wavelengths here)
-            points_3D = points_3D[np.max(points_3D, axis=1) < 1]
-            points_3D = points_3D[np.min(points_3D, axis=1) > -1]
-
-            # Interpret now the 3D positions [-1,1] as points on a grid.
-            pos3D = points_3D * self.grid_size / 2
-            pos3D = pos3D + int(self.grid_size / 2)
-            pos3D = pos3D.astype(int)
-            
-            if len(pos3D) > 1 : 
-                xy, xz, yz = compute_n_unique_dist_on_xy_xz_yz(pos3D)
-                distances_values.append(-(xy+xz+yz)/sum(1 for _ in combinations(pos3D, 2)))
-
-        return distances_values
-
-# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
-
-def init_simple_problem() -> orbital_golomb_array :
-    '''SIMPLE problem configuration with 5 satellites and grid 11*11'''
-
-    # DRO
-    ic = [0.896508460944940632764, 0., 0., 0.000000000000013951082, 0.474817948848534454598, 0.]
-    period = 2.6905181697222775
-    # Number of satellites
-    N = 5
+    def grid_positions(self, X, n_sat=None):
+        """Propagates a population to every observation and interprets the positions as points on the grid.
 
-    # Grid size
-    grid_size = 11
+        Args:
+            X (`np.array` (P, 6N) or (6N,)): population of chromosomes, one per row.
+            n_sat (`int`, optional): Number of satellites N encoded in each row. Defaults to self.n_sat.
+        Returns:
+            (pos3D (P, n_meas, 3, N), valid (P, n_meas, N)): integer grid coordinates of each satellite and
+            whether the satellite is inside the grid (the others are cropped out of the fitness).
+        """
+        return self.formation(X, n_sat).grid_positions(self.grid_size, compact=self.compact)
 
-    ############### Constants
-    # Number of observations
-    M = 3
-    T = period*(M-1) # This makes it so that each observation is made after each period
+    def fitness_batch(self, X, return_all_n_meas_fillfactor: bool = False, threshold=None):
+        """Vectorized fitness function: evaluates a whole population in one pass.
 
-    mu = 0.01215058560962404  # M_L/(M_T + M_L)
+        Gives bit-identical results to `fitness_impl` (with its default arguments) row by row.
+        It carries the `vectorized` attribute checked by `gwo.initial_variables` and can be plugged into
+        scipy with `differential_evolution(lambda x: udp.fitness_batch(x.T)[:, 0], bounds, vectorized=True, updating="deferred")`.
 
-    scaling_factor = 1e-4
+        Args:
+            X (`np.array` (P, 6N) or (6N,)): population of chromosomes, one per row.
+            return_all_n_meas_fillfactor (bool, optional): Return the fitness at every observation instead of the worst one.
+            threshold (`float` or `np.array` (P,), optional): Fitness to beat by each chromosome (see `fitness_impl`).
+                The chromosomes which cannot beat it get REJECTED_FITNESS: they are pruned by the upper bounds of
+                their fill factors when possible, otherwise dropped as soon as one of their observations shows it.
+        Returns:
+            np.array (P, 1) or (P, n_meas): fitness of each chromosome.
+        """
+        if self.backend == "numba" and self.memo is None and threshold is None and self.n_sat > 1:
+            # Fused kernel (einsum accumulates differently on a single satellite)
+            from modules.numba_kernels import fill_factors
+            fill_factor = fill_factors(X, self.n_sat, self.projection, self.grid_size)
+        else:
+            pos3D, valid = self.grid_positions(X)
+            if threshold is not None:
+                threshold = np.broadcast_to(np.asarray(threshold, dtype=float), valid.shape[:1])
+            fill_factor = self._fill_factors(pos3D, valid, threshold)
+
+        if threshold is None:
+            if return_all_n_meas_fillfactor:
+                return -fill_factor
+            return -np.min(fill_factor, axis=1)[:, np.newaxis]  # Return worst of all observations
+
+        # The observations left out (NaN) can only make the worst one worse, the pruned ones (-inf) lose anyway
+        rejected = -np.nanmin(fill_factor, axis=1) >= threshold
+        fitness = -fill_factor if return_all_n_meas_fillfactor else -np.nanmin(fill_factor, axis=1)[:, np.newaxis]
+        fitness[rejected] = REJECTED_FITNESS
+        return fitness
+
+    # Attribute checked by the optimizers in gwo.py to pass the whole population at once
+    fitness_batch.vectorized = True
+
+    def _count_cells(self, pos3D, valid):
+        """`count_autocorrelation_cells_batch` of the selected backend."""
+        if self.backend == "numba":
+            from modules.numba_kernels import count_autocorrelation_cells_batch as count
+            return count(pos3D, valid, self.grid_size)
+        if self.compact:
+            return count_autocorrelation_cells_occupancy(pos3D, valid, self.grid_size)
+        return count_autocorrelation_cells_batch(pos3D, valid, self.grid_size)
+
+    def _count_fill_factors(self, pos3D, valid, threshold=None):
+        """Sum of the XY, XZ and YZ fill factors (P, n_meas) of every chromosome at every observation.
+
+        With a threshold (P,), the observations of each chromosome are counted starting from the one with
+        fewest satellites in the grid, and the chromosomes whose fitness cannot be below their threshold
+        are dropped as soon as it shows: their observations left out are NaN. The chromosomes whose upper
+        bounds (see `_fill_factor_upper_bounds`) already lose are not counted at all: the observations
+        deciding it are -inf.
+        """
+        # Distinct baselines on the XY, XZ and YZ planes of every chromosome at every observation
+        size = 2 * self.grid_size - 1
+        if threshold is None:
+            f = self._count_cells(pos3D, valid) / size / size
+            return f[..., 0] + f[..., 1] + f[..., 2]
+
+        fill_factor = np.full(valid.shape[:2], np.nan)
+        # Bound first: drop the chromosomes which lose before counting any baseline
+        losing = -self._fill_factor_upper_bounds(pos3D, valid) >= threshold[:, np.newaxis]
+        pruned = np.any(losing, axis=1)
+        fill_factor[losing] = -np.inf
+        self.threshold_stats["evaluations"] += len(valid)
+        self.threshold_stats["pruned"] += int(np.count_nonzero(pruned))
+
+        # Cheapest to fail first: fewer satellites in the grid mean fewer baselines (and less counting)
+        epochs = np.argsort(np.count_nonzero(valid, axis=2), axis=1, kind="stable")
+        active = np.flatnonzero(~pruned)
+        n_active = len(active)
+        for step in range(valid.shape[1]):
+            if len(active) == 0:
+                break
+            k = epochs[active, step]
+            f = self._count_cells(pos3D[active, k], valid[active, k]) / size / size
+            fill_factor[active, k] = f[..., 0] + f[..., 1] + f[..., 2]
+            active = active[-fill_factor[active, k] < threshold[active]]
+        self.threshold_stats["rejected"] += n_active - len(active)
+        return fill_factor
+
+    def _fill_factors(self, pos3D, valid, threshold=None):
+        """Same as `_count_fill_factors`, looking up the cell assignments in the memo first when enabled."""
+        if self.memo is None:
+            return self._count_fill_factors(pos3D, valid, threshold)
+
+        fill_factor = np.empty(valid.shape[:2])
+        missing = dict()  # signature -> rows of the population sharing it
+        for p, key in enumerate(grid_signatures(pos3D, valid, self.grid_size)):
+            if key in missing:
+                # Repeated in this population: counted once below
+                missing[key].append(p)
+                self.memo.hits += 1
+                continue
+            value = self.memo.get(key)
+            if value is None:
+                missing.setdefault(key, []).append(p)
+            else:
+                fill_factor[p] = value
+
+        if missing:
+            # Count the baselines once per new signature (against the loosest threshold of the rows sharing it)
+            rows = [p[0] for p in missing.values()]
+            if threshold is not None:
+                threshold = np.array([np.max(threshold[same]) for same in missing.values()])
+            computed = self._count_fill_factors(pos3D[rows], valid[rows], threshold)
+            for (key, same), value in zip(missing.items(), computed):
+                fill_factor[same] = value
+                # Only complete evaluations are remembered
+                if np.isfinite(value).all():
+                    self.memo.put(key, value.copy())
+        return fill_factor
+
+    # Optional method in the UDP pygmo interface
+    # (returns the fitness of many chromosomes stored contiguously in dvs)
+    def batch_fitness(self, dvs):
+        return self.fitness_batch(np.reshape(dvs, (-1, 6 * self.n_sat))).ravel()
 
-    inflation_factor = 1.23
-    ###############
+    def fitness_distance(
+        self,
+        x,
+    ) :
+        """Share of the pairs of satellites with a unique distance on the XY, XZ and YZ planes at each observation
+        (see `compute_n_unique_dist_on_xy_xz_yz`), negated. Observations with less than two satellites in the grid are skipped.
 
-    # Instantiate UDP
-    return orbital_golomb_array(n_sat=N, ic = ic, T = T, grid_size=grid_size, scaling_factor = scaling_factor, n_meas=M, inflation_factor = inflation_factor, mu=mu, verbose=False)
+        Args:
+            x (`list` of length 6N, or `np.array` (P, 6N)): chromosome or population of chromosomes.
+        Returns:
+            `list[float]` (a list of them for a population): -(unique distances)/(pairs of satellites) at each observation.
+        """
+        pos3D, valid = self.grid_positions(x)
+        n_unique = count_unique_distances_batch(pos3D, valid, self.grid_size).sum(axis=2)
+        # Closed-form number of pairs of satellites in the grid
+        n_valid = np.count_nonzero(valid, axis=2)
+        n_pairs = n_valid * (n_valid - 1) // 2
+
+        distances_values = [
+            [-float(unique / pairs) for unique, pairs in zip(row_unique, row_pairs) if pairs > 0]
+            for row_unique, row_pairs in zip(n_unique, n_pairs)
+        ]
+        return distances_values[0] if np.ndim(x) == 1 else distances_values
 
-def init_medium_problem() -> orbital_golomb_array:
-    '''MEDIUM problem configuration with 40 satellites and grid 21*21'''
+# --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 
+# Reference orbits of the mothership: (initial conditions, period)
+ORBITS = {
     # DRO
-    ic = [0.896508460944940632764, 0., 0., 0.000000000000013951082, 0.474817948848534454598, 0.]
-    period = 2.6905181697222775
+    "dro": (
+        [0.896508460944940632764, 0., 0., 0.000000000000013951082, 0.474817948848534454598, 0.],
+        2.6905181697222775,
+    ),
+    # Halo
+    "halo": (
+        [ 1.0829551779304256e+00,-6.9232801936027592e-27,-2.0231744561698364e-01,9.7888791827480806e-15,-2.0102644884016105e-01,2.4744866465838825e-14],
+        2.383491010514447,
+    ),
+}
+
+def init_problem(
+    n_sat: int,
+    grid_size: int,
+    orbit: str = "dro",
+    n_meas: int = 3,
+    inflation_factor: float = 1.23,
+    scaling_factor: float = 1e-4,
+    stm_method: str = "integrate",
+    **kwargs,
+) -> orbital_golomb_array:
+    """
+    Parameterized problem configuration: n_sat satellites on a grid_size*grid_size grid around one of the
+    reference orbits, with n_meas observations, one per period.
 
-    # Number of satellites
-    N = 40
+    Args:
+        n_sat (`int`): Number of satellites.
+        grid_size (`int`): Size of the Golomb grid.
+        orbit (`str`, optional): Reference orbit of the mothership, a key of ORBITS ("dro" or "halo"). Defaults to "dro".
+        n_meas (`int`, optional): Number of observations. Defaults to 3.
+        inflation_factor (`float`, optional): The allowed formation inflation. Defaults to 1.23.
+        scaling_factor (`float`, optional): The initial positions and velocities will be scaled down by this factor. Defaults to 1e-4.
+        stm_method (`str`, optional): "integrate" or "monodromy" (see `orbital_golomb_array`). Defaults to "integrate".
+        **kwargs: other arguments of `orbital_golomb_array` (memo_size, backend, compact, ...).
 
-    # Grid size
-    grid_size = 21
+    Returns:
+        `orbital_golomb_array`: the problem.
+    """
+    if orbit not in ORBITS:
+        raise ValueError(f"Unknown orbit '{orbit}', expected one of {list(ORBITS)}")
+    ic, period = ORBITS[orbit]
 
     ############### Constants
     # Number of observations
-    M = 3
+    M = n_meas
     T = period*(M-1) # This makes it so that each observation is made after each period
 
     mu = 0.01215058560962404  # M_L/(M_T + M_L)
-
-    scaling_factor = 1e-4
-
-    inflation_factor = 1.23
     ###############
 
     # Instantiate UDP
-    return orbital_golomb_array(n_sat=N, ic = ic, T = T, grid_size=grid_size, scaling_factor = scaling_factor, n_meas=M, inflation_factor = inflation_factor, mu=mu, verbose=False)
-
-def init_hard_problem() -> orbital_golomb_array:
-    '''HARD problem configuration with different ic and period compared to medium'''
-    # Halo
-    ic= [ 1.0829551779304256e+00,-6.9232801936027592e-27,-2.0231744561698364e-01,9.7888791827480806e-15,-2.0102644884016105e-01,2.4744866465838825e-14] 
-    period=2.383491010514447 
-
-    # Number of satellites
-    N = 40
-
-    # Grid size
-    grid_size = 21
-
-    ############### Constants
-    # Number of observations
-    M = 3
-    T = period*(M-1) # This makes it so that each observation is made after each period
-
-    mu = 0.01215058560962404  # M_L/(M_T + M_L)
+    kwargs.setdefault("verbose", False)
+    return orbital_golomb_array(n_sat=n_sat, ic = ic, T = T, grid_size=grid_size, scaling_factor = scaling_factor, n_meas=M, inflation_factor = inflation_factor, mu=mu, period=period, stm_method=stm_method, **kwargs)
 
-    scaling_factor = 1e-4
+def init_simple_problem(n_meas: int = 3, stm_method: str = "integrate") -> orbital_golomb_array:
+    '''SIMPLE problem configuration with 5 satellites and grid 11*11 (n_meas observations, one per period)'''
+    return init_problem(n_sat=5, grid_size=11, orbit="dro", n_meas=n_meas, stm_method=stm_method)
 
-    inflation_factor = 1.23
-    ###############
+def init_medium_problem(n_meas: int = 3, stm_method: str = "integrate") -> orbital_golomb_array:
+    '''MEDIUM problem configuration with 40 satellites and grid 21*21 (n_meas observations, one per period)'''
+    return init_problem(n_sat=40, grid_size=21, orbit="dro", n_meas=n_meas, stm_method=stm_method)
 
-    # Instantiate UDP
-    return orbital_golomb_array(n_sat=N, ic = ic, T = T, grid_size=grid_size, scaling_factor = scaling_factor, n_meas=M, inflation_factor = inflation_factor, mu=mu, verbose=False)
+def init_hard_problem(n_meas: int = 3, stm_method: str = "integrate") -> orbital_golomb_array:
+    '''HARD problem configuration with different ic and period compared to medium (n_meas observations, one per period)'''
+    return init_problem(n_sat=40, grid_size=21, orbit="halo", n_meas=n_meas, stm_method=stm_method)
 
 # --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- --- ---
 
@@ -750,36 +701,17 @@ def x_encoded_into_grid_on_t_meas(UDP: orbital_golomb_array, x_encoded : list[(f
     if meas > UDP.n_meas  :
         raise ValueError("Measurement index exceeds the number of measurements in UDP")
         
-    N = UDP.n_sat
-    dx0 = np.array(
-            [(i, j, k, r, m, n) for (i, j, k, r, m, n) in zip(x_encoded[      : N], 
-                                                              x_encoded[N     : 2 * N], 
-                                                              x_encoded[2 * N : 3 * N],
-                                                              x_encoded[3 * N : 4 * N],
-                                                              x_encoded[4 * N : 5 * N],
-                                                              x_encoded[5 * N : ],
-                                                            )
-            ]
-        )
-
-    d_ic = dx0 * UDP.scaling_factor 
-    fc = (UDP.stms[meas] @ d_ic.T).T[:, :3] 
-    points_3D = np.array(fc / UDP.scaling_factor)
-    
-    if meas != 0:
-        points_3D = points_3D / (UDP.inflation_factor)
-            
-    points_3D = points_3D[np.max(points_3D, axis=1) < 1 ]
-    points_3D = points_3D[np.min(points_3D, axis=1) > -1]
-    pos3D = (points_3D * UDP.grid_size / 2)
-    pos3D = pos3D + int(UDP.grid_size / 2)
-    return pos3D.astype(int)
+    pos3D, valid = UDP.formation(x_encoded).grid_positions(UDP.grid_size)
+    return pos3D[0, meas][:, valid[0, meas]].T
 
 def compute_n_unique_dist_on_xy_xz_yz(pos3D) -> tuple[int,int,int]:
     """
     Compute the number of unique distances across three coordinate planes (xy, xz, yz) 
     by evaluating the Manhattan distance between each pair of points.
 
+    The distances (|du|, |dv|) between the distinct points of each plane are packed into integers and
+    counted at once (see `count_unique_distances_batch`).
+
     Args:
         pos3D (`list[tuple[float, float, float]]`): A list of tuples where each tuple
         represents the (x, y, z) coordinates of a point in 3D space.
@@ -787,24 +719,13 @@ def compute_n_unique_dist_on_xy_xz_yz(pos3D) -> tuple[int,int,int]:
     Returns:
         `Tuple[int,int,int]` : (duplicate_distance_xy, duplicate_distance_xz, duplicate_distance_yz)
     """
-
-    def unique_of_distance(distances: list[float]) -> int:
-        """Helper function to check if there are duplicate distances in a given list of distances."""
-        return sum(1 for distance, n_repetitions in Counter(distances).items() if n_repetitions < 2 or distance == (0,0))
-
-    def compute_plane_distances(points: list[tuple[float, float]]) -> list[float]:
-        """Compute the Manhattan distance between pairs of points in the same plane."""
-        return [(abs(u_1 - u_2), abs(v_1 - v_2)) for (u_1, v_1), (u_2, v_2) in combinations(set(points), 2)]
-
-    xy_points = [(x, y) for x, y, _ in pos3D]
-    xz_points = [(x, z) for x, _, z in pos3D]
-    yz_points = [(y, z) for _, y, z in pos3D]
-
-    return (
-        unique_of_distance(compute_plane_distances(xy_points)),
-        unique_of_distance(compute_plane_distances(xz_points)),
-        unique_of_distance(compute_plane_distances(yz_points))
-    )
+    pos3D = np.asarray(pos3D, dtype=int).reshape(-1, 3)
+    if len(pos3D) < 2:
+        return (0, 0, 0)
+    # Shift the points to non-negative coordinates to pack them
+    pos3D = pos3D - pos3D.min(axis=0)
+    counts = count_unique_distances_batch(pos3D.T, np.ones(len(pos3D), dtype=bool), int(pos3D.max()) + 1)
+    return tuple(int(count) for count in counts)
 
 def compute_unique_distances_and_sats_in_grid(udp: orbital_golomb_array, solution: list[float]) -> tuple[float, float]:
     """
@@ -813,38 +734,28 @@ def compute_unique_distances_and_sats_in_grid(udp: orbital_golomb_array, solutio
 
     Args:
         udp (orbital_golomb_array): An instance representing the configuration of the satellites.
-        solution (list[float]): A list representing the proposed positions and velocities of the satellites.
+        solution (list[float]): A list representing the proposed positions and velocities of the satellites
+            (or a `np.array` (P, 6N) of them, one per row).
 
     Returns:
         tuple[float, float]: A tuple containing the normalized count of unique distances and the average
-        number of satellites present in the grid across all measurement times.
+        number of satellites present in the grid across all measurement times (two `np.array` (P,) for a population).
     """
     n_distances = 3 * udp.n_sat * (udp.n_sat - 1) // 2
-    distances_score = 0
-    sats_in_grid_score = 0
-    for i in range(udp.n_meas):
-        x_grid = x_encoded_into_grid_on_t_meas(udp, solution, i)
-        # sats_in_grid --- --- 
-        EYE = np.zeros((udp.grid_size, udp.grid_size, udp.grid_size))
-        for i, j, k_ in x_grid:
-                EYE[i, j, k_] = 1
-        sats_in_grid_score += np.sum(np.max(EYE, axis = (2,))) + np.sum(np.max(EYE, axis = (1,))) + np.sum(np.max(EYE, axis = (0,)))
-        # --- --- ---
-        distances_score += sum(compute_n_unique_dist_on_xy_xz_yz(x_grid))
-        
-    distances_score /= (n_distances * udp.n_meas)
-    sats_in_grid_score /= (udp.n_sat * udp.n_meas * 3)
+    pos3D, valid = udp.grid_positions(solution)
+    # Unique distances and occupied cells on the XY, XZ and YZ planes, summed over the observations
+    distances_score = count_unique_distances_batch(pos3D, valid, udp.grid_size).sum(axis=(1, 2))
+    sats_in_grid_score = count_occupied_plane_cells(pos3D, valid, udp.grid_size).sum(axis=(1, 2))
+
+    distances_score = distances_score / (n_distances * udp.n_meas)
+    sats_in_grid_score = sats_in_grid_score / (udp.n_sat * udp.n_meas * 3)
+    if np.ndim(solution) == 1:
+        return float(distances_score[0]), float(sats_in_grid_score[0])
     return distances_score, sats_in_grid_score
 
 #  --- --- ---  --- --- ---  --- --- ---  --- --- ---  --- --- ---
 def similarity_chk(udp: orbital_golomb_array, x_encoded: list[(float,float,float)], n_orb: int = 300, image_path: str ="../data/nebula.jpg"):
     # Aight, here we gettin' some reconstructed images based on the encoded data and measurables
     I_r_images = udp.plot_simulated_reconstruction(x_encoded, n_orb, image_path=image_path, plot_image=False)
-    # Now we open up the main image and resize it to match the first reconstructed image dimensions
-    I_o = PIL.Image.open(image_path).resize(I_r_images[0].shape[::-1])
-    # We gonna convert those reconstructed images to grayscale, feel me?
-    rec_images_bw = [PIL.Image.fromarray(img.astype('uint8'), mode='L') for img in I_r_images]
-    # Compare dem similarity values between the images, ya dig?
-    values = [SSIM_PIL.compare_ssim(I_o, rec_img, GPU=False) for rec_img in rec_images_bw]
-    # Now let's spit out those values for ya
-    return values
\ No newline at end of file
+    from modules.golomb_plots import ssim_scores
+    return ssim_scores(I_r_images, image_path)
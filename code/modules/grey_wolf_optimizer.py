@@ -1,24 +1,21 @@
-# src: https://www.geeksforgeeks.org/implementation-of-grey-wolf-optimization-gwo-algorithm/ 
-import random
-import copy    # array-copying convenience
-
-class __wolf: 
-  def __init__(self, fitness, dim, minx, maxx, seed): 
-    self.rnd = random.Random(seed) 
-    self.position = [0.0 for i in range(dim)] 
-  
-    for i in range(dim): 
-      self.position[i] = ((maxx - minx) * self.rnd.random() + minx) 
-  
-    self.fitness = fitness(self.position) # curr fitness 
-  
-  
-  
-# grey wolf optimization (GWO) 
-def gwo(fitness, max_iter, num_particles, dim, minx, maxx, verbose=True): 
+# src: https://www.geeksforgeeks.org/implementation-of-grey-wolf-optimization-gwo-algorithm/
+import numpy as np
+
+from modules.gwo import evaluate, target_values
+
+# Iterations of random coefficients drawn at once by every wolf
+COEFFICIENTS_BLOCK = 64
+
+# grey wolf optimization (GWO)
+def gwo(fitness, max_iter, num_particles, dim, minx, maxx, verbose=True, repair=None, start_init=None, seed=None, executor=None):
     """
     Performs Grey Wolf Optimization (GWO) to find the best solution for a given fitness function.
 
+    The positions and the fitness values of the pack live in arrays: every iteration moves all the wolves with the
+    leaders of the previous iteration and evaluates them in one call when the fitness is vectorized (see
+    `orbital_golomb_array.fitness_batch`). Each wolf draws its random numbers from its own stream of the seed, so
+    the runs are reproducible whatever the evaluation order.
+
     Args:
         fitness (`func`): A fitness function that evaluates the quality of a solution.
         max_iter (`int`): The maximum number of iterations to perform.
@@ -26,91 +23,100 @@ def gwo(fitness, max_iter, num_particles, dim, minx, maxx, verbose=True):
         dim (`int`): The dimensionality of the search space.
         minx (`int`): The minimum boundary of the search space.
         maxx (`int`): The maximum boundary of the search space.
-        verbose (`bool` optional) : Print settings and result of gwo 
+        verbose (`bool` optional) : Print settings and result of gwo
+        repair (`func` optional) : Applied to every new position before its evaluation (e.g. `feasibility.FeasibilityRepair`)
+        start_init (`np.ndarray` optional) : Initial positions of the first wolves, one per row (e.g. `feasibility.feasible_population`)
+        seed (`int` optional) : Seed of the random streams of the wolves
+        executor (`concurrent.futures.Executor` optional) : Evaluates a non-vectorized fitness in parallel (see `gwo.evaluate`)
     Returns:
         y(`list` of length N): Chromosome contains position of the best solution found.
+        vet_fitness_alpha(`list`): Value returned by fitness for the alpha after every iteration (e.g. [f] for
+            `orbital_golomb_array.fitness`, kept from its evaluation), its fitness as a `float` for a vectorized fitness.
     """
     if verbose:
-      print("\nBegin grey wolf optimization\n") 
-      print("Setting num_particles = " + str(num_particles)) 
-      print("Setting max_iter    = " + str(max_iter)) 
-      print("\nStarting GWO algorithm\n") 
-
-    rnd = random.Random() 
-  
-    # create n random wolves  
-    population = [ __wolf(fitness, dim, minx, maxx, i) for i in range(num_particles)] 
-  
-    # On the basis of fitness values of wolves  
-    # sort the population in asc order 
-    population = sorted(population, key = lambda temp: temp.fitness) 
-  
-    # best 3 solutions will be called as  
-    # alpha, beta and gaama 
-    alpha_wolf, beta_wolf, gamma_wolf = copy.copy(population[: 3]) 
+      print("\nBegin grey wolf optimization\n")
+      print("Setting num_particles = " + str(num_particles))
+      print("Setting max_iter    = " + str(max_iter))
+      print("\nStarting GWO algorithm\n")
+
+    # One random stream per wolf: its initial position, then A1, A2, A3, C1, C2, C3 of every iteration
+    # (drawn COEFFICIENTS_BLOCK iterations at a time, the streams do not depend on the block)
+    streams = [np.random.default_rng(s) for s in np.random.SeedSequence(seed).spawn(num_particles)]
+    positions = np.array([stream.uniform(minx, maxx, dim) for stream in streams]).reshape(num_particles, dim)
+
+    # create n random wolves
+    if start_init is not None:
+      start_init = np.atleast_2d(start_init)[:num_particles]
+      positions[:len(start_init)] = start_init
+    if repair is not None:
+      positions = repair(positions)
+
+    def evaluate_pack(X):
+      # Fitness of every row as floats, and the values returned by fitness itself (kept for the history)
+      if hasattr(fitness, 'vectorized'):
+        values = evaluate(fitness, X, executor)
+        return values, values.tolist()
+      raw = target_values(fitness, X, executor)
+      return np.array(raw, dtype=float).reshape(len(X)), raw
+
+    fitness_values, fitness_raw = evaluate_pack(positions)
+
+    # best 3 solutions will be called as
+    # alpha, beta and gaama (stable order on ties, as sorting a list)
+    leaders = np.argsort(fitness_values, kind="stable")[:3]
+    leaders = np.concatenate((leaders, np.repeat(leaders[-1:], 3 - len(leaders))))
     vet_fitness_alpha = []
-  
-  
-    # main loop of gwo 
+
+    # main loop of gwo
     Iter = 0
-    while Iter < max_iter: 
-  
-        # after every 10 iterations  
-        # print iteration number and best fitness value so far 
-        if Iter % 10 == 0 and Iter > 1 and verbose: 
-            print("Iter = " + str(Iter) + " best fitness = %.4f" % alpha_wolf.fitness) 
-  
-        # linearly decreased from 2 to 0 
-        a = 2*(1 - Iter/max_iter) 
-  
-        # updating each population member with the help of best three members  
-        for i in range(num_particles): 
-            A1, A2, A3 = a * (2 * rnd.random() - 1), a * ( 
-              2 * rnd.random() - 1), a * (2 * rnd.random() - 1) 
-            C1, C2, C3 = 2 * rnd.random(), 2*rnd.random(), 2*rnd.random() 
-  
-            X1 = [0.0 for i in range(dim)] 
-            X2 = [0.0 for i in range(dim)] 
-            X3 = [0.0 for i in range(dim)] 
-            Xnew = [0.0 for i in range(dim)] 
-            for j in range(dim): 
-                X1[j] = alpha_wolf.position[j] - A1 * abs( 
-                  C1 * alpha_wolf.position[j] - population[i].position[j]) 
-                X2[j] = beta_wolf.position[j] - A2 * abs( 
-                  C2 *  beta_wolf.position[j] - population[i].position[j]) 
-                X3[j] = gamma_wolf.position[j] - A3 * abs( 
-                  C3 * gamma_wolf.position[j] - population[i].position[j]) 
-                Xnew[j]+= X1[j] + X2[j] + X3[j] 
-              
-            for j in range(dim): 
-                Xnew[j]/=3.0
-              
-            # fitness calculation of new solution 
-            fnew = fitness(Xnew) 
-  
-            # greedy selection 
-            if fnew < population[i].fitness: 
-                population[i].position = Xnew 
-                population[i].fitness = fnew 
-                  
-        # On the basis of fitness values of wolves  
-        # sort the population in asc order 
-        population = sorted(population, key = lambda temp: temp.fitness) 
-  
-        # best 3 solutions will be called as  
-        # alpha, beta and gaama 
-        alpha_wolf, beta_wolf, gamma_wolf = copy.copy(population[: 3]) 
-        vet_fitness_alpha.append(fitness(alpha_wolf.position))
-
-          
+    while Iter < max_iter:
+
+        # after every 10 iterations
+        # print iteration number and best fitness value so far
+        if Iter % 10 == 0 and Iter > 1 and verbose:
+            print("Iter = " + str(Iter) + " best fitness = %.4f" % fitness_values[leaders[0]])
+
+        # linearly decreased from 2 to 0
+        a = 2*(1 - Iter/max_iter)
+
+        # updating each population member with the help of best three members
+        if Iter % COEFFICIENTS_BLOCK == 0:
+            block = min(COEFFICIENTS_BLOCK, max_iter - Iter)
+            coefficients = np.array([stream.random((block, 6)) for stream in streams]).reshape(num_particles, block, 6)
+        A = a * (2 * coefficients[:, Iter % COEFFICIENTS_BLOCK, :3] - 1)
+        C = 2 * coefficients[:, Iter % COEFFICIENTS_BLOCK, 3:]
+        Xnew = np.zeros((num_particles, dim))
+        for k, leader in enumerate(positions[leaders]):
+            Xnew += leader - A[:, k, np.newaxis] * np.abs(C[:, k, np.newaxis] * leader - positions)
+        Xnew /= 3.0
+        if repair is not None:
+            Xnew = repair(Xnew)
+
+        # fitness calculation of new solution
+        fnew, fnew_raw = evaluate_pack(Xnew)
+
+        # greedy selection
+        better = fnew < fitness_values
+        positions[better] = Xnew[better]
+        fitness_values[better] = fnew[better]
+        for i in np.flatnonzero(better):
+          fitness_raw[i] = fnew_raw[i]
+
+        # best 3 solutions will be called as
+        # alpha, beta and gaama
+        leaders = np.argsort(fitness_values, kind="stable")[:3]
+        leaders = np.concatenate((leaders, np.repeat(leaders[-1:], 3 - len(leaders))))
+        vet_fitness_alpha.append(fitness_raw[leaders[0]])
+
         Iter+= 1
-    # end-while 
+    # end-while
+    alpha_position = positions[leaders[0]].tolist()
     if verbose:
-      print("\nGWO completed\n") 
-      print("\nBest solution found:") 
-      print(["%.6f"%alpha_wolf.position[k] for k in range(dim)]) 
-      fitness_minimum_gwo = fitness(alpha_wolf.position)  
-      print("fitness of best solution = %.6f" % fitness_minimum_gwo) 
-      print("\nEnd GWO\n") 
-    # returning the best solution 
-    return alpha_wolf.position, vet_fitness_alpha 
\ No newline at end of file
+      print("\nGWO completed\n")
+      print("\nBest solution found:")
+      print(["%.6f"%alpha_position[k] for k in range(dim)])
+      fitness_minimum_gwo = fitness_raw[leaders[0]]
+      print("fitness of best solution = %.6f" % np.ravel(fitness_minimum_gwo)[0])
+      print("\nEnd GWO\n")
+    # returning the best solution
+    return alpha_position, vet_fitness_alpha
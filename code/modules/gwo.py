@@ -11,6 +11,13 @@
 
 # Required Libraries
 import numpy  as np
+import os
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Memory budget of the radius queries of improve_position
+NEIGHBOURS_CHUNK_BYTES = 1 << 26
 
 ############################################################################
 
@@ -20,8 +27,32 @@ def target_function():
 
 ############################################################################
 
+# Function: Evaluate Population
+def evaluate(target_function, positions, executor = None, n_workers = None):
+    # One call for the whole population when the target is vectorized (see orbital_golomb_array.fitness_batch),
+    # otherwise one call per row, spread over the workers of a concurrent.futures executor if given. The rows are
+    # sent in chunks (about 4 per worker), so that a process pool pickles the target once per chunk, not per row.
+    # The workers are n_workers if given, else the ones of the standard pools (private _max_workers attribute,
+    # absent from other Executor implementations), else one per core
+    positions = np.atleast_2d(positions)
+    if hasattr(target_function, 'vectorized'):
+        return np.asarray(target_function(positions), dtype = float).reshape(positions.shape[0])
+    return np.array(target_values(target_function, positions, executor, n_workers), dtype = float).reshape(positions.shape[0])
+
+# Function: Values of a Non-Vectorized Target
+def target_values(target_function, positions, executor = None, n_workers = None):
+    # The values returned by the target for every row, as they are (e.g. [f] for orbital_golomb_array.fitness)
+    positions = np.atleast_2d(positions)
+    if (executor is not None):
+        n_workers = n_workers or getattr(executor, '_max_workers', None) or os.cpu_count() or 1
+        chunksize = -(-positions.shape[0] // (4 * n_workers))
+        return list(executor.map(target_function, positions, chunksize = chunksize))
+    return [target_function(row) for row in positions]
+
+############################################################################
+
 # Function: Initialize Variables
-def initial_variables(size, min_values, max_values, target_function, start_init = None):
+def initial_variables(size, min_values, max_values, target_function, start_init = None, repair = None, executor = None):
     dim = len(min_values)
     if (start_init is not None):
         start_init = np.atleast_2d(start_init)
@@ -31,12 +62,14 @@ def initial_variables(size, min_values, max_values, target_function, start_init
             start_init = np.vstack((start_init[:, :dim], rows))
         else:
             start_init = start_init[:size, :dim]
-        fitness_values = target_function(start_init) if hasattr(target_function, 'vectorized') else np.apply_along_axis(target_function, 1, start_init)
-        population     = np.hstack((start_init, fitness_values[:, np.newaxis] if not hasattr(target_function, 'vectorized') else fitness_values))
+        if (repair is not None):
+            start_init = repair(start_init)
+        population     = np.hstack((start_init, evaluate(target_function, start_init, executor)[:, np.newaxis]))
     else:
         population     = np.random.uniform(min_values, max_values, (size, dim))
-        fitness_values = target_function(population) if hasattr(target_function, 'vectorized') else np.apply_along_axis(target_function, 1, population)
-        population     = np.hstack((population, fitness_values[:, np.newaxis] if not hasattr(target_function, 'vectorized') else fitness_values))
+        if (repair is not None):
+            population = repair(population)
+        population     = np.hstack((population, evaluate(target_function, population, executor)[:, np.newaxis]))
     return population
 
 ############################################################################
@@ -44,19 +77,19 @@ def initial_variables(size, min_values, max_values, target_function, start_init
 # Function: Initialize Alpha
 def alpha_position(min_values, max_values, target_function):
     alpha       = np.zeros((1, len(min_values) + 1))
-    alpha[0,-1] = target_function(np.clip(alpha[0,0:alpha.shape[1]-1], min_values, max_values))
+    alpha[0,-1] = evaluate(target_function, np.clip(alpha[0,0:alpha.shape[1]-1], min_values, max_values))[0]
     return alpha[0,:]
 
 # Function: Initialize Beta
 def beta_position(min_values, max_values, target_function):
     beta       = np.zeros((1, len(min_values) + 1))
-    beta[0,-1] = target_function(np.clip(beta[0,0:beta.shape[1]-1], min_values, max_values))
+    beta[0,-1] = evaluate(target_function, np.clip(beta[0,0:beta.shape[1]-1], min_values, max_values))[0]
     return beta[0,:]
 
 # Function: Initialize Delta
 def delta_position(min_values, max_values, target_function):
     delta       =  np.zeros((1, len(min_values) + 1))
-    delta[0,-1] = target_function(np.clip(delta[0,0:delta.shape[1]-1], min_values, max_values))
+    delta[0,-1] = evaluate(target_function, np.clip(delta[0,0:delta.shape[1]-1], min_values, max_values))[0]
     return delta[0,:]
 
 # Function: Updtade Pack by Fitness
@@ -68,7 +101,7 @@ def update_pack(position, alpha, beta, delta):
     return alpha, beta, delta
 
 # Function: Update Position
-def update_position(position, alpha, beta, delta, a_linear_component, min_values, max_values, target_function):
+def update_position(position, alpha, beta, delta, a_linear_component, min_values, max_values, target_function, repair = None, executor = None):
     dim                     = len(min_values)
     alpha_position          = np.copy(position)
     beta_position           = np.copy(position)
@@ -87,11 +120,17 @@ def update_position(position, alpha, beta, delta, a_linear_component, min_values
     alpha_position[:,:-1]   = np.clip(x1, min_values, max_values)
     beta_position [:,:-1]   = np.clip(x2, min_values, max_values)
     delta_position[:,:-1]   = np.clip(x3, min_values, max_values)
-    alpha_position[:, -1]   = np.apply_along_axis(target_function, 1, alpha_position[:, :-1])
-    beta_position [:, -1]   = np.apply_along_axis(target_function, 1, beta_position [:, :-1])
-    delta_position[:, -1]   = np.apply_along_axis(target_function, 1, delta_position[:, :-1])
+    if (repair is not None):
+        # The mean of the three repaired positions below stays feasible (the feasible region is convex)
+        alpha_position[:,:-1] = repair(alpha_position[:,:-1])
+        beta_position [:,:-1] = repair(beta_position [:,:-1])
+        delta_position[:,:-1] = repair(delta_position[:,:-1])
     updated_position[:,:-1] = np.clip((alpha_position[:, :-1] + beta_position[:, :-1] + delta_position[:, :-1]) / 3, min_values, max_values)
-    updated_position[:, -1] = np.apply_along_axis(target_function, 1, updated_position[:, :-1])
+    # The four candidates of every wolf are evaluated together
+    candidates              = [alpha_position, beta_position, delta_position, updated_position]
+    fitness_values          = evaluate(target_function, np.vstack([c[:, :-1] for c in candidates]), executor)
+    for k, c in enumerate(candidates):
+        c[:, -1]            = fitness_values[k*position.shape[0]:(k+1)*position.shape[0]]
     updated_position        = np.vstack([position, updated_position, alpha_position, beta_position, delta_position])
     updated_position        = updated_position[updated_position[:, -1].argsort()]
     updated_position        = updated_position[:position.shape[0], :]
@@ -109,36 +148,229 @@ def build_distance_matrix(coordinates):
    b = a.reshape(np.prod(a.shape[:-1]), 1, a.shape[-1])
    return np.sqrt(np.einsum('ijk,ijk->ij',  b - a,  b - a)).squeeze()
 
+# Function: Radius Queries
+def sample_neighbours(coordinates, radius, uniform, chunk_bytes = NEIGHBOURS_CHUNK_BYTES):
+    # Maps every uniform[i, j] in [0, 1) to one of the rows within radius[i] of row i (itself included), block of rows
+    # at a time: squared distances from the Gram matrix need O(block * P) memory, not the dense P x P x D differences.
+    # The Gram expansion loses the last digits to cancellation, so the pairs near the radius (often a wolf exactly at
+    # the radius, the updated position being another wolf) are decided by their exact distance, computed from the
+    # differences as build_distance_matrix does
+    n           = coordinates.shape[0]
+    sq_norms    = np.einsum('ij,ij->i', coordinates, coordinates)
+    neighbours  = np.empty(uniform.shape, dtype = np.int64)
+    block       = max(1, chunk_bytes // (32 * n))
+    for start in range(0, n, block):
+        stop    = min(n, start + block)
+        rows    = np.arange(stop - start)
+        scale   = sq_norms[start:stop, np.newaxis] + sq_norms
+        sq_dist = scale - 2 * coordinates[start:stop] @ coordinates.T
+        sq_rad  = radius[start:stop, np.newaxis]**2
+        inside  = sq_dist <= sq_rad
+        r, c    = np.nonzero(np.abs(sq_dist - sq_rad) <= 1e-8 * (scale + sq_rad))
+        if (len(r) > 0):
+            diff            = coordinates[r + start] - coordinates[c]
+            inside[r, c]    = np.sqrt(np.einsum('ij,ij->i', diff, diff)) <= radius[r + start]
+        inside[rows, rows + start] = True
+        # The k-th neighbour of row r is where the running count of the flattened mask reaches (neighbours before row r) + k + 1
+        counts  = np.count_nonzero(inside, axis = 1)
+        before  = np.cumsum(counts) - counts
+        rank    = before[:, np.newaxis] + np.floor(uniform[start:stop] * counts[:, np.newaxis]).astype(np.int64) + 1
+        flat    = np.searchsorted(np.cumsum(inside.ravel()), rank)
+        neighbours[start:stop] = flat - (rows * n)[:, np.newaxis]
+    return neighbours
+
 # Function: Improve Position
-def improve_position(position, updt_position, min_values, max_values, target_function):
+def improve_position(position, updt_position, min_values, max_values, target_function, repair = None, executor = None):
+    # Dimension learning: every coordinate j of wolf i moves by rand * (x[ix_1, j] - x[ix_2, j]), ix_1 drawn among the wolves within
+    # the distance between wolf i and its updated position, ix_2 among the whole pack (all the random numbers are drawn at once)
+    n, dim      = position.shape[0], len(min_values)
     i_position  = np.copy(position)
-    dist_matrix = build_distance_matrix(position[:, :-1])
     min_values  = np.array(min_values)
     max_values  = np.array(max_values)
-    for i in range(position.shape[0]):
-        dist = euclidean_distance(position[i, :-1], updt_position[i, :-1])
-        idx  = np.where(dist_matrix[i, :] <= dist)[0]
-        for j in range(len(min_values)):
-            rand             = np.random.rand()
-            ix_1             = np.random.choice(idx)
-            ix_2             = np.random.choice(position.shape[0])
-            i_position[i, j] = np.clip(i_position[i, j] + rand * (position[ix_1, j] - position[ix_2, j]), min_values[j], max_values[j])
-        i_position[i, -1] = target_function(i_position[i, :-1])
-        min_fitness       = min(position[i, -1], updt_position[i, -1], i_position[i, -1])
-        if (updt_position[i, -1] == min_fitness):
-            i_position[i, :] = updt_position[i, :]
-        elif (position[i, -1] == min_fitness):
-            i_position[i, :] = position[i, :]
+    radius      = np.sqrt(np.sum((position[:, :-1] - updt_position[:, :-1])**2, axis = 1))
+    rand        = np.random.rand(n, dim)
+    ix_1        = sample_neighbours(position[:, :-1], radius, np.random.rand(n, dim))
+    ix_2        = np.random.randint(n, size = (n, dim))
+    columns     = np.arange(dim)
+    i_position[:, :-1] = np.clip(position[:, :-1] + rand * (position[ix_1, columns] - position[ix_2, columns]), min_values, max_values)
+    # The whole pack is evaluated in one call
+    if (repair is not None):
+        i_position[:, :-1] = repair(i_position[:, :-1])
+    i_position[:, -1] = evaluate(target_function, i_position[:, :-1], executor)
+    min_fitness       = np.minimum(np.minimum(position[:, -1], updt_position[:, -1]), i_position[:, -1])
+    from_updt         = updt_position[:, -1] == min_fitness
+    from_position     = ~from_updt & (position[:, -1] == min_fitness)
+    i_position[from_updt]     = updt_position[from_updt]
+    i_position[from_position] = position[from_position]
     return i_position
 
 ############################################################################
 
+# Engine: GWO and iGWO with preallocated buffers
+class GreyWolfEngine:
+    # State of a (improved) grey wolf optimization, updated in place: every work array is allocated once, the
+    # leaders and the survivors are selected with argpartition instead of sorting the whole pool (only the pack_size
+    # survivors are sorted) and the history of the alpha fitness is a fixed-size array. The steps are the ones of grey_wolf_optimizer / improved_grey_wolf_optimizer,
+    # with the random numbers drawn from a seeded numpy Generator.
+    #
+    # engine = GreyWolfEngine(pack_size, min_values, max_values, iterations, target_function, improved = True, seed = 0)
+    # alpha, alpha_fit = engine.run()
+
+    def __init__(self, pack_size, min_values, max_values, iterations, target_function, improved = True, start_init = None, repair = None, executor = None, seed = None):
+        self.min_values      = np.asarray(min_values, dtype = float)
+        self.max_values      = np.asarray(max_values, dtype = float)
+        self.pack_size       = pack_size
+        self.dim             = len(min_values)
+        self.iterations      = iterations
+        self.target_function = target_function
+        self.improved        = improved
+        self.repair          = repair
+        self.executor        = executor
+        self.rng             = np.random.default_rng(seed)
+        P, D                 = pack_size, self.dim
+
+        # pool[:P] is the pack, pool[P:] the candidates of every wolf (averaged, towards alpha, beta and delta)
+        self.pool            = np.empty((5 * P, D))
+        self.pool_fitness    = np.empty(5 * P)
+        self.pack            = self.pool[:P]
+        self.fitness         = self.pool_fitness[:P]
+        self.candidates      = self.pool[P:].reshape(4, P, D)
+        self.leaders         = np.empty((3, D))
+        self.leaders_fitness = np.empty(3)
+        # Work buffers of the steps
+        self._a              = np.empty((P, D))
+        self._c              = np.empty((P, D))
+        self._survivors      = np.empty((P, D))
+        self._survivors_fit  = np.empty(P)
+        self._moved          = np.empty((P, D))
+        self._moved_fit      = np.empty(P)
+        self._gather         = np.empty((P, D))
+        self._index          = np.empty((P, D), dtype = np.int64)
+        self._columns        = np.arange(D)
+        self.history         = np.full(iterations + 2, np.nan)
+        self.count           = 0
+
+        # Initial pack: start_init first, then uniform in the bounds
+        n_init               = 0 if start_init is None else min(len(np.atleast_2d(start_init)), P)
+        if (n_init > 0):
+            self.pack[:n_init] = np.atleast_2d(start_init)[:n_init, :D]
+        rows                 = self.pack[n_init:]
+        self.rng.random(out = rows)
+        rows                *= self.max_values - self.min_values
+        rows                += self.min_values
+        self._evaluate(self.pack, self.fitness)
+        self._select_leaders()
+        self.history[0]      = self.leaders_fitness[0]
+
+    def _evaluate(self, positions, out):
+        if (self.repair is not None):
+            positions[:] = self.repair(positions)
+        out[:] = evaluate(self.target_function, positions, self.executor)
+
+    def _select_leaders(self):
+        k                    = min(3, self.pack_size)
+        idx                  = np.argpartition(self.fitness, k - 1)[:k]
+        idx                  = idx[np.argsort(self.fitness[idx], kind = 'stable')]
+        idx                  = np.concatenate((idx, np.repeat(idx[-1:], 3 - k)))
+        np.take(self.pack, idx, axis = 0, out = self.leaders)
+        self.leaders_fitness[:] = self.fitness[idx]
+
+    def _update_position(self, a_linear_component):
+        # a and c are shared by the three leaders, as in update_position
+        a, c                 = self._a, self._c
+        self.rng.random(out = a)
+        a                   *= 2 * a_linear_component
+        a                   -= a_linear_component
+        self.rng.random(out = c)
+        c                   *= 2
+        for k in range(3):
+            x                = self.candidates[k + 1]
+            np.multiply(c, self.leaders[k], out = x)
+            x               -= self.pack
+            np.abs(x, out = x)
+            x               *= a
+            np.subtract(self.leaders[k], x, out = x)
+            np.clip(x, self.min_values, self.max_values, out = x)
+        mean                 = self.candidates[0]
+        np.add(self.candidates[1], self.candidates[2], out = mean)
+        mean                += self.candidates[3]
+        mean                /= 3
+        np.clip(mean, self.min_values, self.max_values, out = mean)
+        self._evaluate(self.pool[self.pack_size:], self.pool_fitness[self.pack_size:])
+        # Best pack_size rows among the pack and the candidates, sorted by fitness as in update_position: survivor i
+        # is the i-th best row, the one paired with wolf i by the dimension learning
+        idx                  = np.argpartition(self.pool_fitness, self.pack_size - 1)[:self.pack_size]
+        idx                  = idx[np.argsort(self.pool_fitness[idx], kind = 'stable')]
+        np.take(self.pool, idx, axis = 0, out = self._survivors)
+        np.take(self.pool_fitness, idx, out = self._survivors_fit)
+
+    def _improve_position(self):
+        # Dimension learning of improve_position, between the pack and the survivors of the update
+        P, D                 = self.pack_size, self.dim
+        moved, gather, index = self._moved, self._gather, self._index
+        np.subtract(self.pack, self._survivors, out = moved)
+        radius               = np.sqrt(np.einsum('ij,ij->i', moved, moved))
+        self.rng.random(out = gather)
+        ix_1                 = sample_neighbours(self.pack, radius, gather)
+        np.multiply(ix_1, D, out = index)
+        index               += self._columns
+        np.take(self.pack, index, out = gather)
+        self.rng.random(out = moved)
+        moved               *= P
+        np.copyto(index, moved, casting = 'unsafe')
+        index               *= D
+        index               += self._columns
+        np.take(self.pack, index, out = moved)
+        np.subtract(gather, moved, out = gather)
+        self.rng.random(out = moved)
+        gather              *= moved
+        gather              += self.pack
+        np.clip(gather, self.min_values, self.max_values, out = gather)
+        gather_fitness       = self._moved_fit
+        self._evaluate(gather, gather_fitness)
+        # Best of the wolf, its survivor and its move
+        best                 = np.minimum(np.minimum(self.fitness, self._survivors_fit), gather_fitness)
+        from_survivor        = self._survivors_fit == best
+        from_move            = ~from_survivor & (self.fitness != best)
+        self.pack[from_survivor]    = self._survivors[from_survivor]
+        self.fitness[from_survivor] = self._survivors_fit[from_survivor]
+        self.pack[from_move]        = gather[from_move]
+        self.fitness[from_move]     = gather_fitness[from_move]
+
+    def step(self):
+        # One iteration: leaders, update of the positions and, for the iGWO, dimension learning
+        a_linear_component   = 2 - self.count*(2/self.iterations)
+        self._update_position(a_linear_component)
+        if (self.improved):
+            self._improve_position()
+        else:
+            self.pack[:]     = self._survivors
+            self.fitness[:]  = self._survivors_fit
+        self._select_leaders()
+        self.count           = self.count + 1
+        self.history[self.count] = self.leaders_fitness[0]
+        return self.leaders_fitness[0]
+
+    def run(self, verbose = False, target_value = None):
+        # iterations + 1 steps, as the functions (count = 0, ..., iterations); the history holds the alpha fitness
+        # before the first step and after every step
+        while (self.count <= self.iterations):
+            if verbose is True:
+                print('Iteration = ', self.count, ' f(x) = ', self.leaders_fitness[0])
+            if (target_value is not None and self.leaders_fitness[0] <= target_value):
+                break
+            self.step()
+        alpha                = np.append(self.leaders[0], self.leaders_fitness[0])
+        return alpha, self.history[:self.count + 1]
+
+############################################################################
+
 # Function: iGWO
-def improved_grey_wolf_optimizer(pack_size = 25, min_values = [-100,-100], max_values = [100,100], iterations = 500, target_function = target_function, verbose = True, start_init = None, target_value = None):   
+def improved_grey_wolf_optimizer(pack_size = 25, min_values = [-100,-100], max_values = [100,100], iterations = 500, target_function = target_function, verbose = True, start_init = None, target_value = None, repair = None, executor = None):   
     alpha    = alpha_position(min_values, max_values, target_function)
     beta     = beta_position (min_values, max_values, target_function)
     delta    = delta_position(min_values, max_values, target_function)
-    position = initial_variables(pack_size, min_values, max_values, target_function, start_init)
+    position = initial_variables(pack_size, min_values, max_values, target_function, start_init, repair, executor)
     count    = 0
     alpha_fit = []
     while (count <= iterations):
@@ -147,8 +379,8 @@ def improved_grey_wolf_optimizer(pack_size = 25, min_values = [-100,-100], max_v
         alpha_fit.append(alpha[-1])     
         a_linear_component = 2 - count*(2/iterations)
         alpha, beta, delta = update_pack(position, alpha, beta, delta)
-        updt_position      = update_position(position, alpha, beta, delta, a_linear_component, min_values, max_values, target_function)      
-        position           = improve_position(position, updt_position, min_values, max_values, target_function)
+        updt_position      = update_position(position, alpha, beta, delta, a_linear_component, min_values, max_values, target_function, repair, executor)      
+        position           = improve_position(position, updt_position, min_values, max_values, target_function, repair, executor)
         if (target_value is not None):
             if (alpha[-1] <= target_value):
                 count = 2* iterations
@@ -160,11 +392,11 @@ def improved_grey_wolf_optimizer(pack_size = 25, min_values = [-100,-100], max_v
 
 ############################################################################
 # Function: GWO
-def grey_wolf_optimizer(pack_size = 5, min_values = [-100,-100], max_values = [100,100], iterations = 50, target_function = target_function, verbose = True, start_init = None, target_value = None):    
+def grey_wolf_optimizer(pack_size = 5, min_values = [-100,-100], max_values = [100,100], iterations = 50, target_function = target_function, verbose = True, start_init = None, target_value = None, repair = None, executor = None):    
     alpha    = alpha_position(min_values, max_values, target_function)
     beta     = beta_position (min_values, max_values, target_function)
     delta    = delta_position(min_values, max_values, target_function)
-    position = initial_variables(pack_size, min_values, max_values, target_function, start_init)
+    position = initial_variables(pack_size, min_values, max_values, target_function, start_init, repair, executor)
     count    = 0
     alpha_fit = []
     while (count <= iterations): 
@@ -173,7 +405,7 @@ def grey_wolf_optimizer(pack_size = 5, min_values = [-100,-100], max_values = [1
         alpha_fit.append(alpha[-1])    
         a_linear_component = 2 - count*(2/iterations)
         alpha, beta, delta = update_pack(position, alpha, beta, delta)
-        position           = update_position(position, alpha, beta, delta, a_linear_component, min_values, max_values, target_function)    
+        position           = update_position(position, alpha, beta, delta, a_linear_component, min_values, max_values, target_function, repair, executor)    
         if (target_value is not None):
             if (alpha[-1] <= target_value):
                 count = 2* iterations
@@ -183,4 +415,133 @@ def grey_wolf_optimizer(pack_size = 5, min_values = [-100,-100], max_values = [1
             count = count + 1       
     return alpha, alpha_fit
 
-############################################################################
\ No newline at end of file
+############################################################################
+
+############################################################################
+
+# Target of the worker processes started by asynchronous_grey_wolf_optimizer (sent once, not with every task)
+_worker_target = None
+
+# Function: Initialize Worker
+def _init_worker(target_function):
+    global _worker_target
+    _worker_target = target_function
+
+# Function: Timed Evaluation (in a worker)
+def _timed_evaluation(target_function, position):
+    start = time.perf_counter()
+    value = evaluate(_worker_target if target_function is None else target_function, position)[0]
+    return value, time.perf_counter() - start
+
+# Function: Asynchronous Steady-State GWO
+def asynchronous_grey_wolf_optimizer(pack_size = 25, min_values = [-100,-100], max_values = [100,100], evaluations = 5000, target_function = target_function, verbose = True, start_init = None, target_value = None, repair = None, executor = None, n_workers = None, seed = None):
+    # Steady-state GWO without generational barrier: every free worker evaluates the move of the next wolf towards
+    # the current leaders, and each result replaces its wolf as soon as it completes if it is better (greedy
+    # replacement), updating the leaders of the following moves. A wolf has at most one evaluation in flight. NaN
+    # counts as inf, and the wolves without a finite fitness are re-sampled until there are three leaders
+    # (RuntimeError if the budget of evaluations runs out first).
+    # The evaluations run in a process pool of n_workers (os.cpu_count() by default) unless an executor is given;
+    # the target must then be picklable (e.g. udp.fitness of an orbital_golomb_array, not a lambda). It pays off
+    # when an evaluation costs much more than its round trip to a worker (milliseconds) and varies between wolves.
+    # Returns alpha (position and fitness), alpha_fit (alpha fitness after every evaluation) and the utilization of
+    # the workers: share of n_workers * elapsed time spent in the target function.
+    min_values      = np.asarray(min_values, dtype = float)
+    max_values      = np.asarray(max_values, dtype = float)
+    dim             = len(min_values)
+    rng             = np.random.default_rng(seed)
+    n_workers       = n_workers if n_workers is not None else (os.cpu_count() or 1)
+    position        = rng.uniform(min_values, max_values, (pack_size, dim))
+    if (start_init is not None):
+        start_init  = np.atleast_2d(start_init)[:pack_size, :dim]
+        position[:start_init.shape[0]] = start_init
+    if (repair is not None):
+        position    = repair(position)
+    fitness         = np.full(pack_size, np.inf)
+    in_flight       = np.zeros(pack_size, dtype = bool)
+    pending         = {}
+    initial         = list(range(pack_size))
+    alpha_fit       = []
+    submitted       = 0
+    busy_time       = 0.0
+    turn            = 0
+    own_executor    = executor is None
+    if (own_executor):
+        executor    = ProcessPoolExecutor(n_workers, initializer = _init_worker, initargs = (target_function,))
+    task_target     = None if own_executor else target_function
+
+    def next_move():
+        # Next wolf without evaluation in flight, moved towards the three best wolves evaluated so far
+        nonlocal turn
+        while (in_flight[turn % pack_size]):
+            turn = turn + 1
+        wolf               = turn % pack_size
+        turn               = turn + 1
+        a_linear_component = 2 - submitted*(2/evaluations)
+        leaders            = position[np.argsort(fitness, kind = 'stable')[:3]]
+        a                  = 2 * a_linear_component * rng.random(dim) - a_linear_component
+        c                  = 2 * rng.random(dim)
+        moves              = np.clip(leaders - a * np.abs(c * leaders - position[wolf]), min_values, max_values)
+        if (repair is not None):
+            moves = repair(moves)
+        return wolf, np.clip(moves.mean(axis = 0), min_values, max_values)
+
+    start = time.perf_counter()
+    try:
+        while (True):
+            stop = submitted >= evaluations or (target_value is not None and fitness.min() <= target_value)
+            # Keep every worker busy: initial wolves first, then moves as soon as three wolves have a finite fitness
+            # (until then, the wolves whose evaluation returned inf or NaN are re-sampled in the bounds)
+            while (not stop and len(pending) < n_workers and submitted < evaluations):
+                failed = np.flatnonzero(~np.isfinite(fitness) & ~in_flight)
+                if (initial):
+                    wolf     = initial.pop(0)
+                    x        = position[wolf].copy()
+                elif (np.count_nonzero(np.isfinite(fitness)) < min(3, pack_size)):
+                    if (len(failed) == 0):
+                        break
+                    wolf     = failed[0]
+                    x        = rng.uniform(min_values, max_values, dim)
+                    if (repair is not None):
+                        x    = repair(x)
+                elif (not in_flight.all()):
+                    wolf, x  = next_move()
+                else:
+                    break
+                in_flight[wolf] = True
+                pending[executor.submit(_timed_evaluation, task_target, x)] = (wolf, x)
+                submitted       = submitted + 1
+            if (not pending):
+                break
+            done, _ = wait(pending, return_when = FIRST_COMPLETED)
+            for future in done:
+                wolf, x         = pending.pop(future)
+                value, seconds  = future.result()
+                value           = np.inf if np.isnan(value) else value
+                busy_time       = busy_time + seconds
+                in_flight[wolf] = False
+                if (value < fitness[wolf] or not np.isfinite(fitness[wolf])):
+                    position[wolf] = x
+                    fitness[wolf]  = value
+                alpha_fit.append(fitness.min())
+                if (verbose is True and len(alpha_fit) % pack_size == 0):
+                    print('Evaluations = ', len(alpha_fit), ' f(x) = ', alpha_fit[-1])
+    finally:
+        for future in pending:
+            future.cancel()
+        if (own_executor):
+            executor.shutdown(wait = True, cancel_futures = True)
+    if (np.count_nonzero(np.isfinite(fitness)) < min(3, pack_size)):
+        raise RuntimeError('The target returned inf or NaN for all but %d of the %d evaluations: no leaders to move the pack towards' % (np.count_nonzero(np.isfinite(fitness)), len(alpha_fit)))
+    elapsed     = time.perf_counter() - start
+    utilization = {
+        'evaluations': len(alpha_fit),
+        'n_workers':   n_workers,
+        'elapsed':     elapsed,
+        'busy':        busy_time,
+        'utilization': busy_time / (n_workers * elapsed) if elapsed > 0 else 0.0,
+    }
+    if verbose is True:
+        print('Worker utilization = %.1f%%' % (100 * utilization['utilization']))
+    best  = np.argmin(fitness)
+    alpha = np.append(position[best], fitness[best])
+    return alpha, alpha_fit, utilization
@@ -0,0 +1,150 @@
+import numpy as np
+
+from modules.fill_factor import PLANES
+
+class IncrementalFitness:
+    """
+    Fitness evaluator bound to a current chromosome of an `orbital_golomb_array`, rescoring the moves
+    that change a single satellite in O(N) instead of recomputing all the O(N^2) baselines.
+
+    For every observation and every plane (XY, XZ, YZ) it keeps the histogram of the multiplicities of
+    the baselines (difference vectors between pairs of satellites inside the grid). Moving one satellite
+    only removes and adds its own N-1 baselines, and the number of distinct baselines changes only where
+    a bin of the histogram becomes empty or stops being empty.
+
+    Example:
+        evaluator = IncrementalFitness(udp, x)
+        if evaluator.propose(sat, new_values) < evaluator.score:
+            evaluator.accept()
+        else:
+            evaluator.reject()
+
+    The scores are exactly the ones returned by `udp.fitness_impl(x)[0]` with the default arguments.
+    """
+
+    def __init__(self, udp, x):
+        """
+        Args:
+            udp (`orbital_golomb_array`): The orbital Golomb problem.
+            x (`list` of length 6N): Initial chromosome (it is copied).
+        """
+        self.udp = udp
+        self.n_sat = udp.n_sat
+        self.x = np.array(x, dtype=float).reshape(6 * self.n_sat)
+        self._size = 2 * udp.grid_size - 1
+        # Packed baselines satisfy |du * size + dv| <= (grid_size - 1) * size + grid_size - 1
+        self._n_keys = (udp.grid_size - 1) * self._size + udp.grid_size
+
+        pos3D, valid = udp.grid_positions(self.x)
+        self.pos3D, self.valid = pos3D[0].astype(np.int64), valid[0]
+        n_meas = self.valid.shape[0]
+
+        self.hist = np.zeros((n_meas, 3, self._n_keys), dtype=np.int64)
+        self._hist_flat = self.hist.reshape(-1)
+        self._offsets = (np.arange(n_meas * 3) * self._n_keys).reshape(n_meas, 3, 1)
+        i, j = np.triu_indices(self.n_sat, 1)
+        for k in range(n_meas):
+            pair_valid = self.valid[k, i] & self.valid[k, j]
+            diff = self.pos3D[k][:, j[pair_valid]] - self.pos3D[k][:, i[pair_valid]]
+            for plane, (u, v) in enumerate(PLANES):
+                keys = np.abs(diff[u] * self._size + diff[v])
+                self.hist[k, plane] = np.bincount(keys, minlength=self._n_keys)
+
+        # Distinct nonzero baselines (the zero offset is accounted through n_valid)
+        self.distinct = np.count_nonzero(self.hist[:, :, 1:], axis=2)
+        self.n_valid = np.count_nonzero(self.valid, axis=1)
+        self.score, self.fill_factor = self._score(self.distinct, self.n_valid)
+        self._pending = None
+
+    def _score(self, distinct, n_valid):
+        """Fitness and fill factor at each observation, computed as in `fitness_impl`."""
+        counts = 2 * distinct + (n_valid > 0)[:, np.newaxis]
+        f = counts / self._size / self._size
+        fill_factor = f[:, 0] + f[:, 1] + f[:, 2]
+        return float(-np.min(fill_factor)), fill_factor
+
+    def _pair_keys(self, cells, cells_valid, others):
+        """
+        Baselines between one satellite and the others at every observation and on every plane.
+
+        Args:
+            cells (`np.ndarray` (n_meas, 3)): grid coordinates of the satellite at each observation.
+            cells_valid (`np.ndarray` (n_meas,)): whether the satellite is inside the grid at each observation.
+            others (`np.ndarray` (N,)): mask of the satellites to pair with.
+
+        Returns:
+            `np.ndarray`: packed baselines of the valid pairs, offset into the flattened histogram.
+        """
+        diff = self.pos3D[:, :, others] - cells[:, :, np.newaxis]
+        keys = np.stack([np.abs(diff[:, u] * self._size + diff[:, v]) for u, v in PLANES], axis=1)
+        keys += self._offsets
+        pair_valid = self.valid[:, others] & cells_valid[:, np.newaxis]
+        return keys[np.broadcast_to(pair_valid[:, np.newaxis, :], keys.shape)]
+
+    def satellite(self, sat: int) -> np.ndarray:
+        """Returns the current (dx, dy, dz, dvx, dvy, dvz) of a satellite."""
+        return self.x[sat :: self.n_sat].copy()
+
+    def propose(self, sat: int, values) -> float:
+        """
+        Scores the current chromosome with the 6 components of one satellite replaced, without applying the move.
+
+        Args:
+            sat (`int`): Index of the satellite to move.
+            values (`list` of length 6): New (dx, dy, dz, dvx, dvy, dvz) of the satellite.
+
+        Returns:
+            `float`: fitness of the chromosome after the move.
+        """
+        values = np.array(values, dtype=float).reshape(6)
+        new_pos, new_valid = self.udp.grid_positions(values, n_sat=1)
+        new_pos, new_valid = new_pos[0, :, :, 0].astype(np.int64), new_valid[0, :, 0]
+
+        others = np.ones(self.n_sat, dtype=bool)
+        others[sat] = False
+        old_keys = self._pair_keys(self.pos3D[:, :, sat], self.valid[:, sat], others)
+        new_keys = self._pair_keys(new_pos, new_valid, others)
+
+        # Net change of the multiplicity of every touched baseline
+        keys, inverse = np.unique(np.concatenate((old_keys, new_keys)), return_inverse=True)
+        delta = np.bincount(inverse[len(old_keys):], minlength=len(keys)) - np.bincount(inverse[: len(old_keys)], minlength=len(keys))
+        keys, delta = keys[delta != 0], delta[delta != 0]
+
+        # A baseline appears (disappears) when its bin stops (starts) being empty
+        before = self._hist_flat[keys]
+        after = before + delta
+        nonzero = keys % self._n_keys != 0
+        bins = keys // self._n_keys
+        n_bins = self.hist.shape[0] * 3
+        distinct = self.distinct + (
+            np.bincount(bins[nonzero & (before == 0) & (after > 0)], minlength=n_bins)
+            - np.bincount(bins[nonzero & (before > 0) & (after == 0)], minlength=n_bins)
+        ).reshape(-1, 3)
+
+        n_valid = self.n_valid - self.valid[:, sat] + new_valid
+        score, fill_factor = self._score(distinct, n_valid)
+        self._pending = (sat, values, new_pos, new_valid, keys, delta, distinct, n_valid, score, fill_factor)
+        return score
+
+    def accept(self) -> float:
+        """
+        Applies the last proposed move.
+
+        Returns:
+            `float`: the new fitness of the current chromosome.
+        """
+        if self._pending is None:
+            raise ValueError("No move has been proposed")
+        sat, values, new_pos, new_valid, keys, delta, distinct, n_valid, score, fill_factor = self._pending
+        self._hist_flat[keys] += delta
+        self.x[sat :: self.n_sat] = values
+        self.pos3D[:, :, sat] = new_pos
+        self.valid[:, sat] = new_valid
+        self.distinct, self.n_valid = distinct, n_valid
+        self.score, self.fill_factor = score, fill_factor
+        self._pending = None
+        return self.score
+
+    def reject(self) -> None:
+        """Discards the last proposed move."""
+        self._pending = None
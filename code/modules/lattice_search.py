@@ -0,0 +1,150 @@
+""" Discrete search of the orbital Golomb problem over the cells of the satellites instead of their initial states.
+The fitness only depends on the cells occupied at every observation, so the moves relocate a single satellite
+to another reachable triple of cells (one cell per observation) and every evaluation changes the formation.
+The moves are scored in O(N) by `IncrementalFitness` and the chromosome is only validated through `fitness_impl`
+periodically and at the end. """
+import numpy as np
+
+from modules.cell_mapping import solve_cells
+from modules.feasibility import FeasibleSampler
+from modules.incremental_fitness import IncrementalFitness
+
+class CellCatalogue:
+    """
+    Reachable cells of a single satellite: the distinct sequences of cells (one per observation, all inside the
+    grid) met by uniform samples of its feasible initial states (see `feasibility.FeasibleSampler`), each with a
+    witness initial state landing in them.
+
+    The witnesses are moved to the least-squares state of their cells when it lands with some margin (see
+    `cell_mapping.solve_cells`), away from the edges of the cells where rounding could change the assignment.
+    """
+
+    def __init__(self, udp, n_samples: int = 50000, seed=None, chunk: int = 50000):
+        """
+        Args:
+            udp (`orbital_golomb_array`): The orbital Golomb problem.
+            n_samples (`int`, optional): number of feasible initial states sampled.
+            seed (`int`, optional): seed of the random generator.
+            chunk (`int`, optional): number of states propagated at once.
+        """
+        rng = np.random.default_rng(seed)
+        sampler = FeasibleSampler(udp)
+        lower, upper = sampler.lower, sampler.upper
+        cells, states = [], []
+        for start in range(0, n_samples, chunk):
+            n = min(chunk, n_samples - start)
+            sample = sampler.sample_states(n, rng)
+            # One chromosome with n satellites: positions (M, 3, n)
+            pos3D, valid = udp.grid_positions(sample.T.reshape(-1), n_sat=n)
+            inside = np.all(valid[0], axis=0)
+            cells.append(pos3D[0][:, :, inside].transpose(2, 0, 1))
+            states.append(sample[inside])
+        cells, states = np.concatenate(cells), np.concatenate(states)
+        self.cells, first = np.unique(cells, axis=0, return_index=True)
+        self.states = states[first]
+
+        centred, feasible, _ = solve_cells(udp.projection, self.cells, udp.grid_size, (lower, upper), tol=1e-6)
+        self.states[feasible] = centred[feasible]
+        self._buckets = None
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+    def neighbours(self, entry: int, radius: int = 1) -> np.ndarray:
+        """Entries whose cells are at most radius cells away from the ones of entry at every observation (entry included)."""
+        if self._buckets is None:
+            # Entries by cell at the first observation (self.cells is sorted, so each cell is a contiguous run)
+            first, starts = np.unique(self.cells[:, 0], axis=0, return_index=True)
+            ends = np.append(starts[1:], len(self.cells))
+            self._buckets = {tuple(cell): (start, end) for cell, start, end in zip(first.tolist(), starts, ends)}
+        steps = range(-radius, radius + 1)
+        centre = self.cells[entry, 0]
+        runs = [
+            self._buckets.get((centre[0] + i, centre[1] + j, centre[2] + k)) for i in steps for j in steps for k in steps
+        ]
+        candidates = np.concatenate([np.arange(*run) for run in runs if run is not None])
+        distance = np.max(np.abs(self.cells[candidates] - self.cells[entry]), axis=(1, 2))
+        return candidates[distance <= radius]
+
+def lattice_search(
+    udp,
+    n_iter: int = 20000,
+    catalogue: CellCatalogue = None,
+    x0=None,
+    temperature=(2.0, 0.05),
+    local_moves: float = 0.5,
+    validate_every: int = 1000,
+    seed=None,
+    verbose=True,
+):
+    """
+    Simulated annealing over the reachable cells of the satellites.
+
+    Each iteration relocates one random satellite to a random entry of the catalogue, or with probability
+    local_moves to an entry next to its current cells. Worse moves are accepted with probability
+    exp(-delta / T), the temperature decreasing geometrically between the two values of temperature.
+
+    Args:
+        udp (`orbital_golomb_array`): The orbital Golomb problem.
+        n_iter (`int`, optional): number of moves.
+        catalogue (`CellCatalogue`, optional): reachable cells, built with the default arguments if not given.
+        x0 (`list` of length 6N, optional): initial chromosome. Defaults to random entries of the catalogue.
+        temperature (`tuple`, optional): initial and final temperatures, in units of one baseline
+                                         (2 / (2 * grid_size - 1)^2 of fill factor).
+        local_moves (`float`, optional): probability of a move to neighbouring cells.
+        validate_every (`int`, optional): iterations between two checks of the incremental score against `fitness_impl`.
+        seed (`int`, optional): seed of the random generator.
+        verbose (boolean): print the progress at every validation.
+
+    Returns:
+        (best_x `np.ndarray` (6N,), best_fit `list`): best chromosome found and the best fitness at every validation.
+    """
+    rng = np.random.default_rng(seed)
+    if catalogue is None:
+        catalogue = CellCatalogue(udp, seed=seed)
+    n_sat = udp.n_sat
+
+    # Entry of the catalogue occupied by every satellite (-1 when unknown, as for x0)
+    if x0 is None:
+        entries = rng.integers(len(catalogue), size=n_sat)
+        x0 = catalogue.states[entries].T.reshape(-1)
+    else:
+        entries = np.full(n_sat, -1)
+    evaluator = IncrementalFitness(udp, x0)
+
+    baseline = 2 / (2 * udp.grid_size - 1) ** 2
+    t_start, t_end = temperature[0] * baseline, temperature[1] * baseline
+    best_x, best_score = evaluator.x.copy(), evaluator.score
+    best_fit, mismatches = [], 0
+    for it in range(n_iter):
+        t = t_start * (t_end / t_start) ** (it / max(n_iter - 1, 1))
+        sat = rng.integers(n_sat)
+        if entries[sat] >= 0 and rng.random() < local_moves:
+            entry = rng.choice(catalogue.neighbours(entries[sat]))
+        else:
+            entry = rng.integers(len(catalogue))
+
+        delta = evaluator.propose(sat, catalogue.states[entry]) - evaluator.score
+        if delta <= 0 or rng.random() < np.exp(-delta / t):
+            evaluator.accept()
+            entries[sat] = entry
+            if evaluator.score < best_score:
+                best_x, best_score = evaluator.x.copy(), evaluator.score
+        else:
+            evaluator.reject()
+
+        if (it + 1) % validate_every == 0 or it + 1 == n_iter:
+            # The incremental score must match a full evaluation, rebuild the evaluator otherwise
+            if udp.fitness_impl(evaluator.x)[0] != evaluator.score:
+                mismatches += 1
+                evaluator = IncrementalFitness(udp, evaluator.x)
+            best_fit.append(best_score)
+            if verbose:
+                print("Iteration =", it + 1, " f(x) =", best_score, " current =", evaluator.score, " mismatches =", mismatches)
+
+    # The last entry is the full evaluation of the best chromosome (the starting one when n_iter = 0)
+    if best_fit:
+        best_fit[-1] = udp.fitness_impl(best_x)[0]
+    else:
+        best_fit.append(udp.fitness_impl(best_x)[0])
+    return best_x, best_fit
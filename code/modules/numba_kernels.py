@@ -0,0 +1,163 @@
+""" Optional compiled backend of the fitness of the orbital Golomb problem (see `orbital_golomb_array(backend="numba")`).
+Propagation, cropping, quantization, deduplication of the occupied cells and counting of the distinct baselines are
+fused into one nopython kernel, parallel over the population. The module can be imported without numba: check
+NUMBA_AVAILABLE, `orbital_golomb_array` falls back to the numpy backend on its own. """
+import numpy as np
+
+from modules.fill_factor import count_autocorrelation_cells_batch as numpy_count_cells_batch
+
+try:
+    from numba import njit, prange, get_num_threads
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    # Keep the module importable: the kernels are never called without numba
+    def njit(*args, **kwargs):
+        return lambda function: function
+
+    prange = range
+
+    def get_num_threads():
+        return 1
+
+@njit(cache=True)
+def _plane_count(pos, valid, u, v, grid_size, occupancy, seen, cells_u, cells_v, stamp):
+    """
+    Nonzero cells of the autocorrelation of one plane: 2 * (distinct nonzero baselines) + 1, 0 without satellites.
+
+    The arrays occupancy (grid_size^2) and seen (packed baselines) mark the cells and baselines met with the
+    current stamp, so that they never need to be cleared between calls.
+    """
+    size = 2 * grid_size - 1
+    # Deduplicate the occupied cells: satellites in the same cell add no baseline
+    n_cells = 0
+    for n in range(pos.shape[1]):
+        if valid[n]:
+            cell = pos[u, n] * grid_size + pos[v, n]
+            if occupancy[cell] != stamp:
+                occupancy[cell] = stamp
+                cells_u[n_cells] = pos[u, n]
+                cells_v[n_cells] = pos[v, n]
+                n_cells += 1
+    # Two distinct cells always give a nonzero baseline, packed as in count_autocorrelation_cells
+    distinct = 0
+    for a in range(n_cells):
+        for b in range(a + 1, n_cells):
+            key = abs((cells_u[b] - cells_u[a]) * size + (cells_v[b] - cells_v[a]))
+            if seen[key] != stamp:
+                seen[key] = stamp
+                distinct += 1
+    return 2 * distinct + (1 if n_cells > 0 else 0)
+
+@njit(cache=True, parallel=True)
+def _fill_factors(X, n_sat, projection, grid_size, n_threads):
+    P, M = X.shape[0], projection.shape[0]
+    size = 2 * grid_size - 1
+    half = grid_size // 2
+    n_keys = (grid_size - 1) * size + grid_size
+    fill_factor = np.empty((P, M))
+    # One set of scratch arrays per thread, reused through the stamps: the cost per chromosome does not depend on the grid size
+    for t in prange(n_threads):
+        pos = np.empty((3, n_sat), dtype=np.int64)
+        valid = np.empty(n_sat, dtype=np.bool_)
+        occupancy = np.zeros(grid_size * grid_size, dtype=np.int64)
+        seen = np.zeros(n_keys, dtype=np.int64)
+        cells_u = np.empty(n_sat, dtype=np.int64)
+        cells_v = np.empty(n_sat, dtype=np.int64)
+        stamp = 0
+        for p in range(t, P, n_threads):
+            for k in range(M):
+                # Propagate, crop and quantize (same operations, in the same order, as Formation.grid_positions)
+                for n in range(n_sat):
+                    inside = True
+                    for i in range(3):
+                        position = 0.0
+                        for j in range(6):
+                            position += projection[k, i, j] * X[p, j * n_sat + n]
+                        inside = inside and position < 1.0 and position > -1.0
+                        pos[i, n] = int(position * grid_size / 2 + half) if inside else 0
+                    valid[n] = inside
+                total = 0.0
+                for u, v in ((0, 1), (0, 2), (1, 2)):
+                    stamp += 1
+                    total += _plane_count(pos, valid, u, v, grid_size, occupancy, seen, cells_u, cells_v, stamp) / size / size
+                fill_factor[p, k] = total
+    return fill_factor
+
+@njit(cache=True, parallel=True)
+def _count_cells_batch(pos3D, valid, grid_size, n_threads):
+    R, N = valid.shape
+    size = 2 * grid_size - 1
+    n_keys = (grid_size - 1) * size + grid_size
+    counts = np.empty((R, 3), dtype=np.int64)
+    for t in prange(n_threads):
+        occupancy = np.zeros(grid_size * grid_size, dtype=np.int64)
+        seen = np.zeros(n_keys, dtype=np.int64)
+        cells_u = np.empty(N, dtype=np.int64)
+        cells_v = np.empty(N, dtype=np.int64)
+        stamp = 0
+        for r in range(t, R, n_threads):
+            for plane, (u, v) in enumerate(((0, 1), (0, 2), (1, 2))):
+                stamp += 1
+                counts[r, plane] = _plane_count(pos3D[r], valid[r], u, v, grid_size, occupancy, seen, cells_u, cells_v, stamp)
+    return counts
+
+def fill_factors(X, n_sat: int, projection, grid_size: int) -> np.ndarray:
+    """
+    Fused kernel: sum of the XY, XZ and YZ fill factors of every chromosome at every observation.
+
+    Args:
+        X (`np.ndarray` (P, 6N) or (6N,)): population of chromosomes, one per row.
+        n_sat (`int`): number of satellites N.
+        projection (`np.ndarray` (M, 3, 6)): projection tensor of the problem (see `projection_tensor`).
+        grid_size (`int`): size of the Golomb grid.
+
+    Returns:
+        `np.ndarray` (P, M): fill factors, as `orbital_golomb_array._count_fill_factors`.
+    """
+    X = np.ascontiguousarray(np.asarray(X, dtype=np.float64).reshape(-1, 6 * n_sat))
+    return _fill_factors(X, n_sat, np.ascontiguousarray(projection, dtype=np.float64), grid_size, min(get_num_threads(), len(X)))
+
+def count_autocorrelation_cells_batch(pos3D, valid, grid_size: int) -> np.ndarray:
+    """Compiled version of `fill_factor.count_autocorrelation_cells_batch` (same arguments and result)."""
+    valid = np.asarray(valid, dtype=bool)
+    batch_shape, N = valid.shape[:-1], valid.shape[-1]
+    pos3D = np.ascontiguousarray(np.asarray(pos3D, dtype=np.int64).reshape(-1, 3, N))
+    valid = np.ascontiguousarray(valid.reshape(-1, N))
+    counts = _count_cells_batch(pos3D, valid, grid_size, max(1, min(get_num_threads(), len(valid))))
+    return counts.reshape(batch_shape + (3,))
+
+def check_backend(udp, n_samples: int = 10000, seed: int = 0) -> dict:
+    """
+    Compares the compiled kernels with the numpy implementation on random chromosomes.
+
+    The fused kernel accumulates the propagation in the order of numpy's einsum, so that the satellites fall in
+    the same cells: run this check once on a new platform or numpy version before relying on the backend.
+
+    Args:
+        udp (`orbital_golomb_array`): The orbital Golomb problem.
+        n_samples (`int`, optional): number of random chromosomes, spread from compact to scattered formations.
+        seed (`int`, optional): seed of the random generator.
+
+    Returns:
+        `dict`: number of samples, of fill factors differing with the fused kernel and with the compiled counting,
+                and whether everything is identical.
+    """
+    X = udp.sample_population(n_samples, seed)
+    pos3D, valid = udp.formation(X).grid_positions(udp.grid_size)
+    size = 2 * udp.grid_size - 1
+    f = numpy_count_cells_batch(pos3D, valid, udp.grid_size) / size / size
+    expected = f[..., 0] + f[..., 1] + f[..., 2]
+
+    f = count_autocorrelation_cells_batch(pos3D, valid, udp.grid_size) / size / size
+    counted = f[..., 0] + f[..., 1] + f[..., 2]
+    fused = fill_factors(X, udp.n_sat, udp.projection, udp.grid_size)
+
+    report = {
+        "samples": n_samples,
+        "fused_mismatches": int(np.count_nonzero(fused != expected)),
+        "counting_mismatches": int(np.count_nonzero(counted != expected)),
+    }
+    report["identical"] = report["fused_mismatches"] == 0 and report["counting_mismatches"] == 0
+    return report
@@ -30,15 +30,11 @@ def print_result(udp: orbital_golomb_array, x_solution, N_obs: int = 300, show_s
     print("N sat: ", udp.n_sat, "\tGrid size: ", udp.grid_size)
     if isinstance(x_solution[0], (list, np.ndarray, array)):
         # then x_solution is a vector of solutions
-        distance, sat, fitness = [], [], []
-        for solution in x_solution:
-            distance_score, sat_score = compute_unique_distances_and_sats_in_grid(
-                udp, solution
-            )
-            fitness_score = udp.fitness(solution)[0]
-            distance.append(distance_score)
-            sat.append(sat_score)
-            fitness.append(fitness_score)
+        # All the solutions are scored at once
+        population = np.array(x_solution, dtype=float)
+        distance, sat = compute_unique_distances_and_sats_in_grid(udp, population)
+        distance, sat = distance.tolist(), sat.tolist()
+        fitness = udp.fitness_batch(population)[:, 0].tolist()
 
         # mean of all score
         best_solution_idx = sorted(
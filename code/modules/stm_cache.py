@@ -0,0 +1,136 @@
+""" Persistent on-disk cache of the reference trajectories and STMs built by `stm_factory`. """
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+# Bump to invalidate every entry written by a previous version of the integration
+CACHE_VERSION = 1
+
+def default_cache_dir() -> str:
+    """Cache location, can be moved with the GOLOMB_STM_CACHE environment variable (read at every call)."""
+    return os.environ.get("GOLOMB_STM_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "golomb_stm"))
+
+def cache_key(ic, T: float, mu: float, M: int, tol: float) -> str:
+    """
+    Content address of a set of STMs.
+
+    Args:
+        ic (`list` of length 6): initial conditions (absolute) of the reference trajectory.
+        T (`float`): propagation time.
+        mu (`float`): gravity parameter.
+        M (`int`): number of grid points (observations).
+        tol (`float`): tolerance of the Taylor integrator.
+
+    Returns:
+        `str`: hexadecimal digest identifying the entry.
+    """
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_VERSION}:M={int(M)}:".encode())
+    h.update(np.asarray(list(ic) + [T, mu, tol], dtype=np.float64).tobytes())
+    return h.hexdigest()
+
+def _entry_dir(key: str, cache_dir: str = None) -> str:
+    return os.path.join(cache_dir or default_cache_dir(), key)
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _file_stat(path: str) -> dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def load_stms(ic, T: float, mu: float, M: int, tol: float, cache_dir: str = None, mmap_mode: str = "r", verify: bool = False):
+    """
+    Loads the reference trajectory and STMs from the cache.
+
+    Entries failing the integrity checks (missing files, different parameters, sizes or modification times) are
+    removed. The checksums are only compared with verify, which reads the whole files and defeats the memory map.
+
+    Args:
+        ic, T, mu, M, tol: parameters of `stm_factory` (see `cache_key`).
+        cache_dir (`str`, optional): cache location. Defaults to `default_cache_dir()`.
+        mmap_mode (`str`, optional): memory-map mode of `np.load`. Defaults to read-only "r".
+        verify (boolean, optional): also compare the SHA-256 checksums of the files.
+
+    Returns:
+        `tuple` (ref_state (M, 6), stms (M, 6, 6)) or None if there is no valid entry.
+    """
+    key = cache_key(ic, T, mu, M, tol)
+    path = _entry_dir(key, cache_dir)
+    if not os.path.isdir(path):
+        return None
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta["key"] != key or meta["version"] != CACHE_VERSION:
+            raise ValueError("stale entry")
+        arrays = []
+        for name in ("ref_state", "stms"):
+            file = os.path.join(path, name + ".npy")
+            if _file_stat(file) != meta["files"][name]:
+                raise ValueError(f"size or modification time mismatch on {name}")
+            if verify and _file_digest(file) != meta["sha256"][name]:
+                raise ValueError(f"checksum mismatch on {name}")
+            arrays.append(np.load(file, mmap_mode=mmap_mode))
+        ref_state, stms = arrays
+        if ref_state.shape != (M, 6) or stms.shape != (M, 6, 6):
+            raise ValueError("unexpected shapes")
+    except (OSError, ValueError, KeyError):
+        shutil.rmtree(path, ignore_errors=True)
+        return None
+    return ref_state, stms
+
+def store_stms(ic, T: float, mu: float, M: int, tol: float, ref_state, stms, cache_dir: str = None) -> str:
+    """
+    Stores the reference trajectory and STMs in the cache as memory-mappable .npy files.
+
+    The entry is written in a temporary directory and moved in place, so that concurrent
+    processes never read a partially written entry.
+
+    Args:
+        ic, T, mu, M, tol: parameters of `stm_factory` (see `cache_key`).
+        ref_state (`np.array` (M, 6)): propagated reference state.
+        stms (`np.array` (M, 6, 6)): state transition matrices.
+        cache_dir (`str`, optional): cache location. Defaults to `default_cache_dir()`.
+
+    Returns:
+        `str`: path of the entry.
+    """
+    key = cache_key(ic, T, mu, M, tol)
+    path = _entry_dir(key, cache_dir)
+    root = os.path.dirname(path)
+    os.makedirs(root, exist_ok=True)
+
+    tmp = tempfile.mkdtemp(dir=root, prefix=".tmp-")
+    meta = {"key": key, "version": CACHE_VERSION, "ic": list(map(float, ic)), "T": T, "mu": mu, "M": int(M), "tol": tol, "sha256": {}, "files": {}}
+    for name, array in (("ref_state", ref_state), ("stms", stms)):
+        file = os.path.join(tmp, name + ".npy")
+        np.save(file, np.ascontiguousarray(array, dtype=np.float64))
+        meta["sha256"][name] = _file_digest(file)
+        # Renaming the directory keeps the sizes and modification times checked by load_stms
+        meta["files"][name] = _file_stat(file)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # Another process stored the same entry in the meantime
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+def invalidate(ic, T: float, mu: float, M: int, tol: float, cache_dir: str = None) -> None:
+    """Removes a single entry from the cache."""
+    shutil.rmtree(_entry_dir(cache_key(ic, T, mu, M, tol), cache_dir), ignore_errors=True)
+
+def clear_cache(cache_dir: str = None) -> None:
+    """Removes every entry from the cache."""
+    shutil.rmtree(cache_dir or default_cache_dir(), ignore_errors=True)